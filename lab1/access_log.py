@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Асинхронный буферизованный журнал доступа для HTTP-серверов заданий 3 и 5
+
+Обработчик запроса только кладет кортеж с полями записи в очередь в памяти
+(log) и не ждет вывода. Фоновый поток забирает записи пачками, форматирует
+их (combined - формат Apache/nginx, json - по объекту JSON на строку) и
+выводит одной записью на пачку. Файл журнала ротируется по размеру:
+access.log -> access.log.1 -> ... -> access.log.N. Если поток записи не
+успевает и очередь заполнена, новые записи отбрасываются, а счетчик dropped
+растет - медленный диск не замедляет обработку запросов.
+"""
+
+import contextlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: межпроцессной блокировки нет
+
+FORMATS = ('combined', 'json')
+
+class AccessLog:
+    """Журнал доступа с очередью и фоновым потоком записи
+
+    path - файл журнала или '-' для stdout. Записи из нескольких процессов
+    в один файл допустимы: файл открыт на дозапись, проверка размера, ротация
+    и запись выполняются под блокировкой fcntl.flock файла path.lock, а после
+    ротации другим процессом журнал открывается заново.
+    """
+    
+    def __init__(self, path='-', fmt='combined', max_queue=10000, batch_size=256,
+                 flush_interval=0.5, max_bytes=10 * 1024 * 1024, backup_count=5):
+        if fmt not in FORMATS:
+            raise ValueError(f"неизвестный формат журнала {fmt}")
+        self.path = path
+        self.format_record = self.format_json if fmt == 'json' else self.format_combined
+        self.records = queue.Queue(max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self.lock_file = None  # открывается в потоке записи, то есть после fork
+        self.written = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.last_second = None  # кэш отформатированного времени для combined
+        self.last_timestamp = ''
+        self.thread = threading.Thread(target=self.run, name='access-log', daemon=True)
+        self.thread.start()
+    
+    def log(self, remote, request_line, status, size, referer='-', user_agent='-', duration=0.0):
+        """Ставит запись в очередь; при заполненной очереди запись отбрасывается"""
+        try:
+            self.records.put_nowait((time.time(), remote, request_line, status, size,
+                                     referer, user_agent, duration))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+    
+    def close(self):
+        """Дописывает оставшиеся записи и останавливает поток записи"""
+        # None в очереди - сигнал остановки; ждем место, а не отбрасываем его
+        self.records.put(None)
+        self.thread.join()
+    
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped,
+                'queued': self.records.qsize()}
+    
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.records.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Забираем все, что накопилось, но не больше batch_size за раз
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [record for record in batch if record is not None]
+            if batch:
+                try:
+                    self.write("".join(self.format_record(record) for record in batch))
+                    self.written += len(batch)
+                except (OSError, ValueError) as e:
+                    print(f"Ошибка записи журнала доступа: {e}", file=sys.stderr)
+                    with self.lock:
+                        self.dropped += len(batch)
+        if self.file is not None:
+            self.file.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+    
+    def write(self, text):
+        if self.path == '-':
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        data = text.encode('utf-8')
+        # Без блокировки два процесса, одновременно превысившие лимит, сдвинули
+        # бы архивы дважды и потеряли одно поколение
+        with self.locked():
+            if self.file is None or self.rotated_elsewhere():
+                self.reopen()
+            # Размер берется у файла: в него пишут и другие процессы
+            size = os.fstat(self.file.fileno()).st_size
+            if self.max_bytes and size and size + len(data) > self.max_bytes:
+                self.rotate()
+            self.file.write(data)
+            self.file.flush()
+    
+    @contextlib.contextmanager
+    def locked(self):
+        """Межпроцессная блокировка журнала на время проверки размера, ротации и записи"""
+        if fcntl is None:
+            yield
+            return
+        if self.lock_file is None:
+            self.lock_file = open(f"{self.path}.lock", 'ab')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+    
+    def reopen(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'ab')
+    
+    def rotated_elsewhere(self):
+        """Файл журнала переименован или удален (например, ротацией в другом процессе)"""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+    
+    def rotate(self):
+        """Сдвигает архивы журнала на один номер и начинает новый файл"""
+        self.file.close()
+        self.file = None
+        if self.backup_count:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.reopen()
+    
+    def format_combined(self, record):
+        timestamp, remote, request_line, status, size, referer, user_agent, duration = record
+        second = int(timestamp)
+        if second != self.last_second:
+            self.last_second = second
+            self.last_timestamp = time.strftime('%d/%b/%Y:%H:%M:%S %z', time.localtime(second))
+        return (f'{remote} - - [{self.last_timestamp}] "{quote(request_line)}" {status} '
+                f'{size if size else "-"} "{quote(referer)}" "{quote(user_agent)}"\n')
+    
+    def format_json(self, record):
+        timestamp, remote, request_line, status, size, referer, user_agent, duration = record
+        return json.dumps({
+            'time': round(timestamp, 3),
+            'remote': remote,
+            'request': request_line,
+            'status': status,
+            'size': size,
+            'referer': referer,
+            'user_agent': user_agent,
+            'duration_ms': round(duration * 1000, 3),
+        }, ensure_ascii=False) + "\n"
+
+def quote(value):
+    """Экранирует кавычки и обратную косую черту для поля в кавычках"""
+    return value.replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Инкрементальный разбор HTTP/1.x запросов для серверов заданий 3 и 5
+
+Данные из сокета по мере поступления добавляются в буфер (feed), а
+next_request возвращает очередной полный запрос или None, если он еще не
+пришел целиком. Заголовки, разорванные между сегментами TCP, дочитываются;
+стартовая строка и заголовки разбираются один раз, тело читается ровно по
+Content-Length или по кускам Transfer-Encoding: chunked. Размеры заголовков и
+тела ограничены; при нарушении формата или лимитов - исключение HttpError
+с кодом ответа.
+"""
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+MAX_CHUNK_LINE = 1024
+HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+class HttpError(Exception):
+    """Запрос не удается разобрать; status - код ответа, после него соединение закрывается"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class HttpRequest:
+    """Разобранный запрос: стартовая строка, заголовки (имена в нижнем регистре) и тело"""
+    
+    __slots__ = ('method', 'path', 'version', 'headers', 'body')
+    
+    def __init__(self, method, path, version, headers, body=b""):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+    
+    @property
+    def request_line(self):
+        return f"{self.method} {self.path} {self.version}"
+    
+    @property
+    def keep_alive(self):
+        """Оставить ли соединение открытым по версии HTTP и заголовку Connection"""
+        tokens = {token.strip().lower() for token in self.headers.get('connection', '').split(',')}
+        if self.version == 'HTTP/1.1':
+            return 'close' not in tokens
+        return 'keep-alive' in tokens
+
+def find_head_end(buffer, start=0):
+    """Возвращает (конец заголовков, длина разделителя) или (-1, 0)"""
+    # Допускаем и "\r\n\r\n", и "\n\n" (например, запросы из nc)
+    found = [(position, len(separator)) for separator in (b"\r\n\r\n", b"\n\n")
+             for position in (buffer.find(separator, start),) if position >= 0]
+    return min(found) if found else (-1, 0)
+
+def parse_head(head):
+    """Разбирает стартовую строку и заголовки в HttpRequest без тела"""
+    lines = head.decode('utf-8', 'replace').split('\n')
+    parts = lines[0].split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise HttpError(400, 'Bad Request')
+    if len(lines) - 1 > MAX_HEADERS:
+        raise HttpError(431, 'Request Header Fields Too Large')
+    
+    headers = {}
+    for line in lines[1:]:
+        name, separator, value = line.partition(':')
+        name = name.strip().lower()
+        if not separator or not name:
+            raise HttpError(400, 'Bad Request')
+        value = value.strip()
+        # Повторяющиеся заголовки объединяются через запятую
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return HttpRequest(parts[0], parts[1], parts[2], headers)
+
+class HttpParser:
+    """Инкрементальный разборщик запросов одного соединения"""
+    
+    def __init__(self, max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.buffer = bytearray()
+        self.scanned = 0  # до этой позиции конец заголовков уже искали
+        self.request = None  # запрос с разобранными заголовками, ждущий тела
+        self.body_length = 0
+        self.chunks = None  # куски тела при Transfer-Encoding: chunked
+    
+    @property
+    def idle(self):
+        """Нет начатого запроса: буфер пуст и тело не ожидается"""
+        return self.request is None and not self.buffer
+    
+    def feed(self, data):
+        """Добавляет полученные из сокета данные"""
+        self.buffer += data
+    
+    def next_request(self):
+        """Возвращает следующий полный запрос или None, если данных пока не хватает"""
+        if self.request is None and not self.read_head():
+            return None
+        if self.chunks is not None:
+            complete = self.read_chunks()
+        else:
+            complete = self.read_body()
+        if not complete:
+            return None
+        request, self.request = self.request, None
+        return request
+    
+    def read_head(self):
+        # Поиск продолжается с места, где остановился прошлый раз: медленный
+        # клиент не заставляет заново просматривать весь буфер
+        head_end, separator_length = find_head_end(self.buffer, max(self.scanned - 3, 0))
+        if head_end < 0:
+            self.scanned = len(self.buffer)
+            if len(self.buffer) > self.max_header_size:
+                raise HttpError(431, 'Request Header Fields Too Large')
+            return False
+        if head_end > self.max_header_size:
+            raise HttpError(431, 'Request Header Fields Too Large')
+        
+        request = parse_head(bytes(self.buffer[:head_end]))
+        del self.buffer[:head_end + separator_length]
+        self.scanned = 0
+        
+        transfer_encoding = request.headers.get('transfer-encoding')
+        if transfer_encoding is not None:
+            if transfer_encoding.lower().split(',')[-1].strip() != 'chunked':
+                raise HttpError(501, 'Not Implemented')
+            self.chunks = []
+            self.body_length = 0
+        else:
+            self.body_length = self.parse_content_length(request.headers.get('content-length'))
+        self.request = request
+        return True
+    
+    def parse_content_length(self, value):
+        if value is None:
+            return 0
+        # Несколько одинаковых значений допустимы, разные - нет
+        values = {item.strip() for item in value.split(',')}
+        if len(values) != 1 or not next(iter(values)).isdigit():
+            raise HttpError(400, 'Bad Request')
+        length = int(values.pop())
+        if length > self.max_body_size:
+            raise HttpError(413, 'Payload Too Large')
+        return length
+    
+    def read_body(self):
+        if len(self.buffer) < self.body_length:
+            return False
+        if self.body_length:
+            self.request.body = bytes(self.buffer[:self.body_length])
+            del self.buffer[:self.body_length]
+        return True
+    
+    def read_chunks(self):
+        """Читает куски chunked-тела, пока они есть в буфере; True - тело получено целиком"""
+        while True:
+            line_end = self.buffer.find(b"\n", 0, MAX_CHUNK_LINE + 1)
+            if line_end < 0:
+                if len(self.buffer) > MAX_CHUNK_LINE:
+                    raise HttpError(400, 'Bad Request')
+                return False
+            size_text = bytes(self.buffer[:line_end]).split(b";")[0].strip()
+            # Только шестнадцатеричные цифры: int() принял бы и знак, "0x" и "_",
+            # а отрицательный размер зациклил бы разбор
+            if not size_text or size_text.lstrip(HEX_DIGITS):
+                raise HttpError(400, 'Bad Request')
+            size = int(size_text, 16)
+            
+            if size == 0:
+                # Последний кусок; после него - необязательные заголовки и пустая строка
+                trailer_end = skip_line_break(self.buffer, line_end + 1, strict=False)
+                if trailer_end is None:
+                    head_end, separator_length = find_head_end(self.buffer, line_end + 1)
+                    if head_end < 0:
+                        if len(self.buffer) > self.max_header_size:
+                            raise HttpError(431, 'Request Header Fields Too Large')
+                        return False
+                    trailer_end = head_end + separator_length
+                del self.buffer[:trailer_end]
+                self.request.body = b"".join(self.chunks)
+                self.chunks = None
+                return True
+            
+            if self.body_length + size > self.max_body_size:
+                raise HttpError(413, 'Payload Too Large')
+            data_end = line_end + 1 + size
+            # За данными куска следует перевод строки
+            next_chunk = skip_line_break(self.buffer, data_end)
+            if next_chunk is None:
+                return False
+            self.chunks.append(bytes(self.buffer[line_end + 1:data_end]))
+            self.body_length += size
+            del self.buffer[:next_chunk]
+
+def skip_line_break(buffer, position, strict=True):
+    """Возвращает позицию после перевода строки в position или None, если данных еще нет
+
+    strict - отсутствие перевода строки считается ошибкой формата.
+    """
+    if buffer.startswith(b"\r\n", position):
+        return position + 2
+    if buffer.startswith(b"\n", position):
+        return position + 1
+    if len(buffer) <= position or (len(buffer) == position + 1 and buffer[position] == ord('\r')):
+        return None
+    if strict:
+        raise HttpError(400, 'Bad Request')
+    return None
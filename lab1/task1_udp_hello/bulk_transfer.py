@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Надежная передача файлов поверх UDP для задания 1
+Скользящее окно с выборочными подтверждениями (selective ACK)
+
+Формат датаграмм (сетевой порядок байт):
+START - тип 'S', id передачи, размер файла, размер блока, окно, имя файла
+DATA  - тип 'D', id передачи, номер блока, данные блока
+ACK   - тип 'A', id передачи, число подряд принятых блоков, битовая карта
+        принятых блоков после них (по одному биту на блок окна)
+"""
+
+import collections
+import os
+import random
+import selectors
+import socket
+import struct
+import time
+
+START = struct.Struct('!cIQHH')
+DATA = struct.Struct('!cII')
+ACK = struct.Struct('!cII')
+
+TYPE_START = b'S'
+TYPE_DATA = b'D'
+TYPE_ACK = b'A'
+
+DEFAULT_CHUNK_SIZE = 1400
+MAX_CHUNK_SIZE = 65000
+MAX_WINDOW = 8192
+MAX_TRANSFER_SIZE = 1024 ** 3
+RECV_BUFFER_SIZE = 65536
+# Ограничения приемника: START сверх них отклоняется
+MAX_TRANSFERS = 16
+MAX_BUFFERED_BYTES = 256 * 1024 * 1024
+# Буфер передачи выделяется частями такого размера по мере прихода блоков
+SEGMENT_SIZE = 1024 * 1024
+
+def build_ack(transfer_id, cumulative, received, window):
+    """Формирует ACK: число подряд принятых блоков и карту блоков после них"""
+    bitmap = bytearray((window + 7) // 8)
+    limit = min(len(received), cumulative + window)
+    for seq in range(cumulative, limit):
+        if received[seq]:
+            offset = seq - cumulative
+            bitmap[offset >> 3] |= 1 << (offset & 7)
+    return ACK.pack(TYPE_ACK, transfer_id, cumulative) + bytes(bitmap)
+
+def parse_ack(data):
+    """Возвращает (id передачи, число подряд принятых блоков, битовая карта)"""
+    _, transfer_id, cumulative = ACK.unpack_from(data)
+    return transfer_id, cumulative, data[ACK.size:]
+
+class Transfer:
+    """Состояние принимаемого файла"""
+    
+    def __init__(self, name, size, chunk_size, window):
+        self.name = name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.window = window
+        self.total_chunks = (size + chunk_size - 1) // chunk_size
+        # Буфер делится на части из целого числа блоков; часть выделяется при
+        # приходе первого ее блока, поэтому START без данных не занимает память
+        self.segment_chunks = max(1, SEGMENT_SIZE // chunk_size)
+        self.segments = [None] * ((self.total_chunks + self.segment_chunks - 1)
+                                  // self.segment_chunks)
+        self.received = bytearray(self.total_chunks)
+        self.received_count = 0
+        self.cumulative = 0
+        self.started = time.monotonic()
+        self.last_progress = self.started  # время последнего нового блока
+        self.complete = self.total_chunks == 0
+    
+    def store(self, seq, payload):
+        """Записывает блок в буфер; возвращает False для дубликата"""
+        if seq >= self.total_chunks or self.received[seq]:
+            return False
+        offset = seq * self.chunk_size
+        expected = min(self.chunk_size, self.size - offset)
+        if len(payload) != expected:
+            return False
+        
+        index, position = divmod(seq, self.segment_chunks)
+        segment = self.segments[index]
+        if segment is None:
+            segment_offset = index * self.segment_chunks * self.chunk_size
+            segment = self.segments[index] = bytearray(
+                min(self.segment_chunks * self.chunk_size, self.size - segment_offset))
+        start = position * self.chunk_size
+        segment[start:start + expected] = payload
+        self.received[seq] = 1
+        self.received_count += 1
+        self.last_progress = time.monotonic()
+        while self.cumulative < self.total_chunks and self.received[self.cumulative]:
+            self.cumulative += 1
+        self.complete = self.cumulative == self.total_chunks
+        return True
+    
+    def ack(self, transfer_id):
+        return build_ack(transfer_id, self.cumulative, self.received, self.window)
+
+class BulkReceiver:
+    """UDP-сервер, собирающий файлы из блоков в буфер в памяти
+    
+    Число одновременных передач и суммарный размер их файлов ограничены
+    (max_transfers, max_buffered): поддельные START не исчерпают память.
+    Передача без новых блоков прерывается через idle_timeout секунд, а
+    передача, не получившая ни одного блока, - через start_timeout.
+    """
+    
+    def __init__(self, host='localhost', port=12345, output_dir='received',
+                 batch_size=256, idle_timeout=30.0, start_timeout=5.0,
+                 max_transfers=MAX_TRANSFERS, max_buffered=MAX_BUFFERED_BYTES):
+        self.host = host
+        self.port = port
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.start_timeout = start_timeout
+        self.max_transfers = max_transfers
+        self.max_buffered = max_buffered
+        self.buffered = 0  # суммарный размер файлов активных передач
+        self.server_socket = None
+        self.selector = selectors.DefaultSelector()
+        self.buffer = bytearray(RECV_BUFFER_SIZE)
+        self.transfers = {}  # {(адрес, id): Transfer}
+        self.finished = collections.OrderedDict()  # {(адрес, id): последний ACK}
+    
+    def start(self):
+        """Запускает цикл приема"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        
+        print(f"UDP Server (bulk) запущен на {self.host}:{self.port}")
+        print(f"Принятые файлы сохраняются в {os.path.abspath(self.output_dir)}")
+        
+        while True:
+            if self.selector.select(timeout=1.0):
+                self.drain_socket()
+            self.expire_idle()
+    
+    def drain_socket(self):
+        """Обрабатывает пачку датаграмм и отвечает одним ACK на передачу"""
+        touched = {}
+        for _ in range(self.batch_size):
+            try:
+                nbytes, address = self.server_socket.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue
+            key = self.handle_datagram(memoryview(self.buffer)[:nbytes], address)
+            if key is not None:
+                touched[key] = address
+        
+        for key, address in touched.items():
+            self.send_ack(key, address)
+    
+    def handle_datagram(self, data, address):
+        """Разбирает датаграмму; возвращает ключ передачи, которой нужен ACK"""
+        if len(data) < DATA.size:
+            return None
+        packet_type = bytes(data[:1])
+        
+        if packet_type == TYPE_START and len(data) >= START.size:
+            _, transfer_id, size, chunk_size, window = START.unpack_from(data)
+            key = (address, transfer_id)
+            if key in self.transfers or key in self.finished:
+                return key
+            if (size > MAX_TRANSFER_SIZE or not 0 < chunk_size <= MAX_CHUNK_SIZE
+                    or not 0 < window <= MAX_WINDOW):
+                print(f"Отклонена передача {transfer_id} от {address}: неверные параметры")
+                return None
+            name = os.path.basename(bytes(data[START.size:]).decode('utf-8', 'replace'))
+            # Имя должно указывать на файл внутри output_dir
+            if name in ('', '.', '..') or '\0' in name:
+                print(f"Отклонена передача {transfer_id} от {address}: неверное имя файла")
+                return None
+            # Объем резервируется целиком при START: сумма буферов не превысит лимит
+            if len(self.transfers) >= self.max_transfers:
+                print(f"Отклонена передача {transfer_id} от {address}: "
+                      f"уже идет {len(self.transfers)} передач")
+                return None
+            if self.buffered + size > self.max_buffered:
+                print(f"Отклонена передача {transfer_id} от {address}: {size} байт "
+                      f"не умещаются в буфер ({self.buffered}/{self.max_buffered} занято)")
+                return None
+            self.transfers[key] = Transfer(name, size, chunk_size, window)
+            self.buffered += size
+            print(f"Начата передача {transfer_id} от {address}: {name}, {size} байт")
+            if self.transfers[key].complete:
+                self.finish(key)
+            return key
+        
+        if packet_type == TYPE_DATA:
+            _, transfer_id, seq = DATA.unpack_from(data)
+            key = (address, transfer_id)
+            transfer = self.transfers.get(key)
+            if transfer is None:
+                # Дубликат после завершения - повторим последний ACK
+                return key if key in self.finished else None
+            transfer.store(seq, data[DATA.size:])
+            if transfer.complete:
+                self.finish(key)
+            return key
+        
+        return None
+    
+    def send_ack(self, key, address):
+        transfer = self.transfers.get(key)
+        ack = transfer.ack(key[1]) if transfer is not None else self.finished.get(key)
+        if ack is None:
+            return
+        try:
+            self.server_socket.sendto(ack, address)
+        except OSError:
+            pass
+    
+    def finish(self, key):
+        """Сохраняет собранный файл на диск"""
+        transfer = self.remove_transfer(key)
+        path = os.path.join(self.output_dir, transfer.name)
+        try:
+            with open(path, 'wb') as f:
+                f.writelines(transfer.segments)
+        except OSError as e:
+            # Ошибка одной передачи (нет места, нет прав, имя занято каталогом)
+            # не останавливает сервер; без итогового ACK отправитель не
+            # сочтет передачу успешной
+            print(f"Передача {key[1]} от {key[0]} не сохранена в {path}: {e}")
+            return
+        
+        self.finished[key] = transfer.ack(key[1])
+        while len(self.finished) > 1024:
+            self.finished.popitem(last=False)
+        elapsed = max(time.monotonic() - transfer.started, 1e-9)
+        print(f"Передача {key[1]} от {key[0]} завершена: {transfer.size} байт "
+              f"за {elapsed:.2f} с ({transfer.size / elapsed / 1024 / 1024:.2f} МБ/с) -> {path}")
+    
+    def remove_transfer(self, key):
+        """Удаляет передачу из активных и освобождает ее объем в буфере"""
+        transfer = self.transfers.pop(key)
+        self.buffered -= transfer.size
+        return transfer
+    
+    def expire_idle(self):
+        """Освобождает память передач, по которым давно нет новых блоков"""
+        now = time.monotonic()
+        for key, transfer in list(self.transfers.items()):
+            # Повторы START и дубликаты блоков не продлевают передачу
+            timeout = self.idle_timeout if transfer.received_count else self.start_timeout
+            if now - transfer.last_progress > timeout:
+                print(f"Передача {key[1]} от {key[0]} прервана по таймауту "
+                      f"({transfer.received_count}/{transfer.total_chunks} блоков)")
+                self.remove_transfer(key)
+    
+    def stop(self):
+        """Останавливает сервер"""
+        if self.server_socket:
+            self.selector.close()
+            self.server_socket.close()
+        print("Сервер завершил работу")
+
+class BulkSender:
+    """Отправитель файла со скользящим окном и повторной отправкой по таймауту"""
+    
+    def __init__(self, host='localhost', port=12345, chunk_size=DEFAULT_CHUNK_SIZE,
+                 window=256, loss=0.0, timeout=10.0):
+        self.server_address = (host, port)
+        self.chunk_size = chunk_size
+        self.window = window
+        self.loss = loss
+        self.timeout = timeout
+        self.transfer_id = random.getrandbits(32)
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self.client_socket.connect(self.server_address)
+        self.client_socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.client_socket, selectors.EVENT_READ)
+        # Оценка RTT по алгоритму Джекобсона, начальный RTO - 200 мс
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = 0.2
+        self.packets_sent = 0
+        self.retransmits = 0
+    
+    def send_file(self, path):
+        """Передает файл; возвращает (байт, секунд)"""
+        with open(path, 'rb') as f:
+            data = memoryview(f.read())
+        name = os.path.basename(path).encode('utf-8')
+        total_chunks = (len(data) + self.chunk_size - 1) // self.chunk_size
+        
+        start = time.perf_counter()
+        self.handshake(len(data), name)
+        
+        acked = bytearray(total_chunks)
+        sent_at = [0.0] * total_chunks
+        retransmitted = bytearray(total_chunks)
+        base = 0
+        next_seq = 0
+        last_progress = time.perf_counter()
+        
+        while base < total_chunks:
+            now = time.perf_counter()
+            
+            # Повторная отправка блоков окна, для которых истек таймаут
+            for seq in range(base, next_seq):
+                if not acked[seq] and now - sent_at[seq] > self.rto:
+                    self.send_chunk(data, seq)
+                    sent_at[seq] = now
+                    retransmitted[seq] = 1
+                    self.retransmits += 1
+            
+            # Новые блоки, пока окно не заполнено
+            while next_seq < total_chunks and next_seq < base + self.window:
+                if not self.send_chunk(data, next_seq):
+                    break
+                sent_at[next_seq] = time.perf_counter()
+                next_seq += 1
+            
+            ack = self.wait_ack(min(self.rto, 0.05))
+            if ack is None:
+                if time.perf_counter() - last_progress > self.timeout:
+                    raise TimeoutError("сервер не подтверждает получение данных")
+                continue
+            
+            cumulative, bitmap = ack
+            now = time.perf_counter()
+            for seq in range(base, min(cumulative, total_chunks)):
+                self.mark_acked(seq, acked, sent_at, retransmitted, now)
+            for offset in range(min(len(bitmap) * 8, total_chunks - cumulative)):
+                if bitmap[offset >> 3] & (1 << (offset & 7)):
+                    self.mark_acked(cumulative + offset, acked, sent_at, retransmitted, now)
+            if cumulative > base:
+                base = cumulative
+                last_progress = now
+        
+        return len(data), time.perf_counter() - start
+    
+    def handshake(self, size, name):
+        """Отправляет START, пока сервер не подтвердит начало передачи"""
+        packet = START.pack(TYPE_START, self.transfer_id, size, self.chunk_size,
+                            self.window) + name
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            self.client_socket.send(packet)
+            self.packets_sent += 1
+            if self.wait_ack(self.rto) is not None:
+                return
+        raise TimeoutError("сервер не ответил на запрос начала передачи")
+    
+    def send_chunk(self, data, seq):
+        """Отправляет блок; возвращает False, если буфер сокета заполнен"""
+        offset = seq * self.chunk_size
+        packet = DATA.pack(TYPE_DATA, self.transfer_id, seq) + data[offset:offset + self.chunk_size]
+        self.packets_sent += 1
+        if self.loss and random.random() < self.loss:
+            # Имитация потери пакета в сети
+            return True
+        try:
+            self.client_socket.send(packet)
+        except (BlockingIOError, InterruptedError):
+            self.packets_sent -= 1
+            return False
+        return True
+    
+    def wait_ack(self, timeout):
+        """Ждет ACK и вычитывает все накопившиеся; возвращает самый полный"""
+        best = None
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                data = self.client_socket.recv(RECV_BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                if best is not None:
+                    return best
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self.selector.select(remaining)
+                continue
+            except ConnectionRefusedError:
+                continue
+            if len(data) < ACK.size or data[:1] != TYPE_ACK:
+                continue
+            transfer_id, cumulative, bitmap = parse_ack(data)
+            if transfer_id != self.transfer_id:
+                continue
+            if best is None or cumulative >= best[0]:
+                best = (cumulative, bitmap)
+    
+    def mark_acked(self, seq, acked, sent_at, retransmitted, now):
+        if acked[seq]:
+            return
+        acked[seq] = 1
+        # Алгоритм Карна: RTT по повторно отправленным блокам не учитывается
+        if not retransmitted[seq]:
+            self.update_rto(now - sent_at[seq])
+    
+    def update_rto(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, 0.01), 2.0)
+    
+    def close(self):
+        self.selector.close()
+        self.client_socket.close()
@@ -2,22 +2,152 @@
 """
 UDP Client для задания 1
 Отправляет сообщение "Hello, server" серверу и получает ответ "Hello, client"
+
+Режимы работы:
+once  - отправляет одно сообщение и выводит ответ (по умолчанию)
+bench - генератор нагрузки: шлет пронумерованные сообщения с заданной
+        частотой с нескольких сокетов, сопоставляет ответы по номеру и
+        выводит пакеты в секунду, долю потерь и перцентили задержки
+send  - надежная передача файла со скользящим окном и выборочными
+        подтверждениями (сервер в режиме bulk)
 """
 
+import argparse
+import selectors
 import socket
 import sys
+import time
 
-def main():
+from bulk_transfer import BulkSender, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, MAX_WINDOW
+
+MESSAGE = "Hello, server"
+
+def percentile(sorted_values, percent):
+    """Возвращает перцентиль отсортированного списка (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class LoadGenerator:
+    """Генератор нагрузки для UDP Hello Server"""
+    
+    def __init__(self, host='localhost', port=12345, rate=1000, sockets=8,
+                 duration=5.0, timeout=1.0):
+        self.server_address = (host, port)
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+        for _ in range(sockets):
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            client_socket.setblocking(False)
+            client_socket.connect(self.server_address)
+            self.selector.register(client_socket, selectors.EVENT_READ)
+            self.sockets.append(client_socket)
+        self.in_flight = {}  # {seq: время отправки}
+        self.latencies = []
+        self.sent = 0
+        self.send_errors = 0
+        self.unexpected = 0
+    
+    def run(self):
+        """Отправляет нагрузку и собирает ответы"""
+        start = time.perf_counter()
+        deadline = start + self.duration
+        
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            
+            # Сколько сообщений должно быть отправлено к текущему моменту
+            if self.rate > 0:
+                due = int((now - start) * self.rate) - self.sent
+            else:
+                due = len(self.sockets)
+            for _ in range(min(due, 1024)):
+                self.send_one()
+            
+            if self.rate > 0:
+                wait = (self.sent + 1) / self.rate - (time.perf_counter() - start)
+                wait = min(max(wait, 0), deadline - time.perf_counter())
+            else:
+                wait = 0
+            self.receive(wait)
+        
+        send_time = time.perf_counter() - start
+        
+        # Дожидаемся запоздавших ответов
+        drain_deadline = time.perf_counter() + self.timeout
+        while self.in_flight and time.perf_counter() < drain_deadline:
+            self.receive(drain_deadline - time.perf_counter())
+        
+        return send_time
+    
+    def send_one(self):
+        """Отправляет одно пронумерованное сообщение"""
+        seq = self.sent
+        client_socket = self.sockets[seq % len(self.sockets)]
+        self.sent += 1
+        try:
+            client_socket.send(f"{MESSAGE} #{seq}".encode('utf-8'))
+        except OSError:
+            # Буфер отправки переполнен - сообщение считается потерянным
+            self.send_errors += 1
+            return
+        self.in_flight[seq] = time.perf_counter()
+    
+    def receive(self, timeout):
+        """Вычитывает все доступные ответы и вычисляет задержки"""
+        for key, _ in self.selector.select(timeout):
+            while True:
+                try:
+                    data = key.fileobj.recv(1024)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except ConnectionRefusedError:
+                    continue
+                now = time.perf_counter()
+                _, sep, seq = data.rpartition(b' #')
+                sent_at = self.in_flight.pop(int(seq), None) if sep and seq.isdigit() else None
+                if sent_at is None:
+                    self.unexpected += 1
+                    continue
+                self.latencies.append(now - sent_at)
+    
+    def report(self, send_time):
+        """Выводит итоговую статистику"""
+        received = len(self.latencies)
+        lost = self.sent - received
+        latencies = sorted(self.latencies)
+        
+        print("=== Результаты нагрузочного теста ===")
+        print(f"Отправлено: {self.sent} за {send_time:.2f} с "
+              f"({self.sent / send_time:.0f} пакетов/с)")
+        print(f"Получено: {received} ({received / send_time:.0f} пакетов/с)")
+        print(f"Потеряно: {lost} ({lost / max(self.sent, 1) * 100:.2f}%), "
+              f"ошибок отправки: {self.send_errors}, "
+              f"неожиданных ответов: {self.unexpected}")
+        print(f"RTT p50: {percentile(latencies, 50) * 1000:.3f} мс, "
+              f"p95: {percentile(latencies, 95) * 1000:.3f} мс, "
+              f"p99: {percentile(latencies, 99) * 1000:.3f} мс")
+    
+    def close(self):
+        """Закрывает сокеты"""
+        self.selector.close()
+        for client_socket in self.sockets:
+            client_socket.close()
+
+def run_once(server_host, server_port):
+    """Отправляет одно сообщение и выводит ответ"""
     # Создаем UDP сокет
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     
-    # Настройки сервера
-    server_host = 'localhost'
-    server_port = 12345
-    
     try:
         # Сообщение для отправки
-        message = "Hello, server"
+        message = MESSAGE
         
         # Отправляем сообщение серверу
         client_socket.sendto(message.encode('utf-8'), (server_host, server_port))
@@ -28,7 +158,7 @@ def main():
         response_message = response.decode('utf-8')
         
         print(f"Получен ответ от сервера {server_address}: {response_message}")
-        
+    
     except Exception as e:
         print(f"Ошибка клиента: {e}")
         sys.exit(1)
@@ -38,5 +168,84 @@ def main():
         client_socket.close()
         print("Клиент завершил работу")
 
+def run_bench(args):
+    """Запускает нагрузочный тест"""
+    generator = LoadGenerator(args.host, args.port, args.rate, args.sockets,
+                              args.duration, args.timeout)
+    print(f"Нагрузка на {args.host}:{args.port}: {args.rate or 'max'} пакетов/с, "
+          f"{args.sockets} сокетов, {args.duration} с")
+    
+    try:
+        send_time = generator.run()
+        generator.report(send_time)
+    except KeyboardInterrupt:
+        print("\nТест прерван пользователем")
+    finally:
+        generator.close()
+
+def run_send(args):
+    """Передает файл серверу в режиме bulk"""
+    if not 0 < args.chunk_size <= MAX_CHUNK_SIZE or not 0 < args.window <= MAX_WINDOW:
+        print(f"Ошибка: размер блока 1..{MAX_CHUNK_SIZE}, окно 1..{MAX_WINDOW}")
+        sys.exit(1)
+    
+    sender = BulkSender(args.host, args.port, args.chunk_size, args.window, args.loss)
+    
+    try:
+        size, elapsed = sender.send_file(args.file)
+        chunks = (size + args.chunk_size - 1) // args.chunk_size
+        elapsed = max(elapsed, 1e-9)
+        print("=== Результаты передачи ===")
+        print(f"Передано: {size} байт за {elapsed:.2f} с "
+              f"({size / elapsed / 1024 / 1024:.2f} МБ/с, "
+              f"{size * 8 / elapsed / 1e6:.1f} Мбит/с)")
+        print(f"Блоков: {chunks}, отправлено пакетов: {sender.packets_sent}, "
+              f"повторных отправок: {sender.retransmits} "
+              f"({sender.retransmits / max(chunks, 1) * 100:.2f}%)")
+    except (OSError, TimeoutError) as e:
+        print(f"Ошибка передачи: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nПередача прервана пользователем")
+    finally:
+        sender.close()
+
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="UDP Hello Client")
+    parser.add_argument('--mode', choices=['once', 'bench', 'send'], default='once',
+                        help="режим работы клиента")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--rate', type=int, default=1000,
+                        help="сообщений в секунду (0 - без ограничения)")
+    parser.add_argument('--sockets', type=int, default=8,
+                        help="число сокетов-отправителей")
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help="длительность отправки в секундах")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="сколько ждать запоздавшие ответы после отправки")
+    parser.add_argument('--file', help="файл для передачи в режиме send")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="размер блока данных в байтах")
+    parser.add_argument('--window', type=int, default=256,
+                        help="размер окна в блоках")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="доля искусственно теряемых пакетов данных (для проверки)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.mode == 'bench':
+        run_bench(args)
+    elif args.mode == 'send':
+        if not args.file:
+            print("Ошибка: укажите файл через --file")
+            sys.exit(1)
+        run_send(args)
+    else:
+        run_once(args.host, args.port)
+
 if __name__ == "__main__":
     main()
@@ -2,19 +2,287 @@
 """
 UDP Server для задания 1
 Принимает сообщение "Hello, server" от клиента и отправляет ответ "Hello, client"
+
+Режимы работы:
+once  - обрабатывает одно сообщение и завершает работу (по умолчанию)
+batch - долгоживущий неблокирующий сервер, который вычитывает датаграммы
+        пачками и отправляет ответы из очереди
+async - сервер на asyncio.DatagramProtocol; с --workers N запускается
+        N процессов, разделяющих порт через SO_REUSEPORT
+bulk  - прием файлов по надежному протоколу со скользящим окном
+        (см. bulk_transfer.py)
 """
 
+import argparse
+import asyncio
+import collections
+import os
+import selectors
+import signal
 import socket
 import sys
+import time
 
-def main():
+from bulk_transfer import MAX_BUFFERED_BYTES, MAX_TRANSFERS, BulkReceiver
+
+RESPONSE = "Hello, client".encode('utf-8')
+BUFFER_SIZE = 1024
+
+def build_response(data):
+    """Формирует ответ; номер запроса вида " #<seq>" возвращается клиенту"""
+    _, sep, seq = bytes(data).rpartition(b' #')
+    if sep and seq.isdigit():
+        return RESPONSE + sep + seq
+    return RESPONSE
+
+class PacketStats:
+    """Счетчики принятых, отправленных и отброшенных датаграмм"""
+    
+    def __init__(self, interval=1.0, label="stats"):
+        self.interval = interval
+        self.label = label
+        self.received = 0
+        self.sent = 0
+        self.dropped = 0
+        self.total_received = 0
+        self.total_sent = 0
+        self.total_dropped = 0
+        self.last_report = time.monotonic()
+    
+    def report_if_due(self, now=None):
+        """Раз в интервал выводит счетчики за секунду и сбрасывает их"""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last_report
+        if elapsed < self.interval:
+            return
+        
+        if self.received or self.sent or self.dropped:
+            print(f"[{self.label}] recv/s: {self.received / elapsed:.0f}, "
+                  f"sent/s: {self.sent / elapsed:.0f}, "
+                  f"dropped/s: {self.dropped / elapsed:.0f}")
+        
+        self.total_received += self.received
+        self.total_sent += self.sent
+        self.total_dropped += self.dropped
+        self.received = self.sent = self.dropped = 0
+        self.last_report = now
+    
+    def summary(self):
+        """Возвращает итоговые значения счетчиков"""
+        return (self.total_received + self.received,
+                self.total_sent + self.sent,
+                self.total_dropped + self.dropped)
+
+class BatchUDPServer:
+    """Неблокирующий UDP-сервер с пакетным чтением и очередью ответов"""
+    
+    def __init__(self, host='localhost', port=12345, batch_size=256, max_queue=65536):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.server_socket = None
+        self.selector = selectors.DefaultSelector()
+        self.replies = collections.deque()
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.stats = PacketStats()
+        self.want_write = False
+    
+    def start(self):
+        """Запускает цикл обработки датаграмм"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        
+        print(f"UDP Server (batch) запущен на {self.host}:{self.port}")
+        print("Ожидание сообщений от клиентов...")
+        
+        while True:
+            for key, events in self.selector.select(timeout=self.stats.interval):
+                if events & selectors.EVENT_READ:
+                    self.drain_socket()
+                if events & selectors.EVENT_WRITE or self.replies:
+                    self.flush_replies()
+            self.stats.report_if_due()
+    
+    def drain_socket(self):
+        """Читает из сокета до batch_size датаграмм за одно пробуждение"""
+        for _ in range(self.batch_size):
+            try:
+                nbytes, client_address = self.server_socket.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                # ICMP port unreachable от предыдущей отправки
+                continue
+            
+            self.stats.received += 1
+            if len(self.replies) >= self.max_queue:
+                self.stats.dropped += 1
+                continue
+            response = build_response(memoryview(self.buffer)[:nbytes])
+            self.replies.append((response, client_address))
+    
+    def flush_replies(self):
+        """Отправляет накопленные ответы, пока сокет принимает данные"""
+        while self.replies:
+            response, client_address = self.replies[0]
+            try:
+                self.server_socket.sendto(response, client_address)
+            except (BlockingIOError, InterruptedError):
+                # Буфер отправки заполнен - дождемся готовности сокета к записи
+                self.set_write_interest(True)
+                return
+            except OSError:
+                self.stats.dropped += 1
+            else:
+                self.stats.sent += 1
+            self.replies.popleft()
+        self.set_write_interest(False)
+    
+    def set_write_interest(self, enabled):
+        """Включает или выключает ожидание готовности сокета к записи"""
+        if enabled == self.want_write:
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if enabled else 0)
+        self.selector.modify(self.server_socket, events)
+        self.want_write = enabled
+    
+    def stop(self):
+        """Останавливает сервер"""
+        if self.server_socket:
+            self.selector.close()
+            self.server_socket.close()
+        received, sent, dropped = self.stats.summary()
+        print(f"Итого: получено {received}, отправлено {sent}, отброшено {dropped}")
+        print("Сервер завершил работу")
+
+class HelloProtocol(asyncio.DatagramProtocol):
+    """asyncio-протокол, отвечающий "Hello, client" на каждую датаграмму"""
+    
+    def __init__(self, stats, max_buffer=4 * 1024 * 1024):
+        self.stats = stats
+        self.max_buffer = max_buffer
+        self.transport = None
+        self.closing = False
+        self.closed = asyncio.get_running_loop().create_future()
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def datagram_received(self, data, addr):
+        self.stats.received += 1
+        # Во время остановки новые запросы не принимаем, а при переполненном
+        # буфере отправки не наращиваем очередь ответов
+        if self.closing or self.transport.get_write_buffer_size() >= self.max_buffer:
+            self.stats.dropped += 1
+            return
+        self.transport.sendto(build_response(data), addr)
+        self.stats.sent += 1
+    
+    def error_received(self, exc):
+        self.stats.dropped += 1
+    
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+async def serve_async(host, port, reuse_port, drain_timeout=5.0):
+    """Обслуживает порт в текущем процессе до получения SIGINT/SIGTERM"""
+    loop = asyncio.get_running_loop()
+    stats = PacketStats(label=f"worker {os.getpid()}")
+    
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: HelloProtocol(stats),
+        local_addr=(host, port),
+        reuse_port=reuse_port or None
+    )
+    print(f"UDP Server (async, pid {os.getpid()}) запущен на {host}:{port}")
+    
+    stop_event = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_event.set)
+    
+    def report():
+        stats.report_if_due()
+        if not stop_event.is_set():
+            loop.call_later(stats.interval, report)
+    
+    loop.call_later(stats.interval, report)
+    await stop_event.wait()
+    
+    # Плавная остановка: перестаем отвечать на новые датаграммы, а close()
+    # транспорта дожидается отправки уже поставленных в очередь ответов
+    protocol.closing = True
+    pending = transport.get_write_buffer_size()
+    transport.close()
+    try:
+        await asyncio.wait_for(protocol.closed, drain_timeout)
+    except asyncio.TimeoutError:
+        transport.abort()
+        print(f"Не удалось отправить {pending} байт ответов за {drain_timeout} с")
+    
+    received, sent, dropped = stats.summary()
+    print(f"Worker {os.getpid()}: получено {received}, отправлено {sent}, отброшено {dropped}")
+
+def run_async_worker(host, port, reuse_port):
+    """Точка входа процесса-обработчика"""
+    try:
+        asyncio.run(serve_async(host, port, reuse_port))
+    except Exception as e:
+        print(f"Ошибка worker {os.getpid()}: {e}")
+        os._exit(1)
+
+def run_async(host, port, workers):
+    """Запускает N процессов asyncio-сервера на общем порту"""
+    if workers <= 1:
+        run_async_worker(host, port, reuse_port=False)
+        print("Сервер завершил работу")
+        return
+    
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        print("Ошибка: SO_REUSEPORT не поддерживается на этой платформе")
+        sys.exit(1)
+    
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            run_async_worker(host, port, reuse_port=True)
+            os._exit(0)
+        children.append(pid)
+    
+    print(f"Запущено {workers} процессов: {children}")
+    
+    def forward(signum, frame):
+        # Передаем сигнал остановки всем процессам-обработчикам
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    print("Сервер завершил работу")
+
+def run_once(host, port):
+    """Обрабатывает одно сообщение и завершает работу"""
     # Создаем UDP сокет
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     
-    # Настройки сервера
-    host = 'localhost'
-    port = 12345
-    
     try:
         # Привязываем сокет к адресу и порту
         server_socket.bind((host, port))
@@ -22,7 +290,7 @@ def main():
         print("Ожидание сообщений от клиента...")
         
         # Получаем сообщение от клиента
-        data, client_address = server_socket.recvfrom(1024)
+        data, client_address = server_socket.recvfrom(BUFFER_SIZE)
         message = data.decode('utf-8')
         
         print(f"Получено сообщение от {client_address}: {message}")
@@ -31,7 +299,7 @@ def main():
         response = "Hello, client"
         server_socket.sendto(response.encode('utf-8'), client_address)
         print(f"Отправлен ответ клиенту: {response}")
-        
+    
     except Exception as e:
         print(f"Ошибка сервера: {e}")
         sys.exit(1)
@@ -41,5 +309,67 @@ def main():
         server_socket.close()
         print("Сервер завершил работу")
 
+def run_batch(host, port, batch_size, max_queue):
+    """Запускает долгоживущий пакетный сервер"""
+    server = BatchUDPServer(host, port, batch_size, max_queue)
+    
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        print("\nСервер остановлен пользователем")
+    except Exception as e:
+        print(f"Ошибка сервера: {e}")
+        sys.exit(1)
+    finally:
+        server.stop()
+
+def run_bulk(host, port, output_dir, max_transfers, max_buffered):
+    """Запускает сервер приема файлов"""
+    server = BulkReceiver(host, port, output_dir, max_transfers=max_transfers,
+                          max_buffered=max_buffered)
+    
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        print("\nСервер остановлен пользователем")
+    except Exception as e:
+        print(f"Ошибка сервера: {e}")
+        sys.exit(1)
+    finally:
+        server.stop()
+
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="UDP Hello Server")
+    parser.add_argument('--mode', choices=['once', 'batch', 'async', 'bulk'], default='once',
+                        help="режим работы сервера")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help="максимум датаграмм, читаемых за одно пробуждение")
+    parser.add_argument('--max-queue', type=int, default=65536,
+                        help="максимальная длина очереди ответов")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число процессов в режиме async (SO_REUSEPORT)")
+    parser.add_argument('--output-dir', default='received',
+                        help="каталог для файлов, принятых в режиме bulk")
+    parser.add_argument('--max-transfers', type=int, default=MAX_TRANSFERS,
+                        help="максимум одновременных передач в режиме bulk")
+    parser.add_argument('--max-buffer', type=int, default=MAX_BUFFERED_BYTES,
+                        help="суммарный размер принимаемых файлов в байтах в режиме bulk")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.mode == 'batch':
+        run_batch(args.host, args.port, args.batch_size, args.max_queue)
+    elif args.mode == 'async':
+        run_async(args.host, args.port, args.workers)
+    elif args.mode == 'bulk':
+        run_bulk(args.host, args.port, args.output_dir, args.max_transfers, args.max_buffer)
+    else:
+        run_once(args.host, args.port)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Безопасное вычисление произвольных формул для задания 2
+
+Формула разбирается модулем ast один раз: разрешены только числа, переменные,
+арифметические операции и функции из белого списка. Проверенное дерево
+компилируется в функцию от переменных, которая кэшируется по тексту формулы,
+поэтому повторные вычисления с новыми значениями переменных не разбирают
+формулу заново.
+"""
+
+import ast
+import collections
+import functools
+import math
+
+MAX_FORMULA_LENGTH = 1000
+# Формула из MAX_FORMULA_LENGTH символов имеет глубину не больше 500, если в
+# ней нет цепочек унарных минусов; такую глубину compile() обходит без ошибок
+MAX_FORMULA_DEPTH = 500
+
+ALLOWED_FUNCTIONS = {
+    'sqrt': math.sqrt,
+    'exp': math.exp,
+    'log': math.log,
+    'log10': math.log10,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'asin': math.asin,
+    'acos': math.acos,
+    'atan': math.atan,
+    'atan2': math.atan2,
+    'hypot': math.hypot,
+    'pow': math.pow,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'abs': abs,
+    'min': min,
+    'max': max,
+}
+
+def float_result(function):
+    """Приводит результат функции к float"""
+    @functools.wraps(function)
+    def wrapper(*args):
+        return float(function(*args))
+    return wrapper
+
+# floor, ceil и abs/min/max от целых вернули бы int, и с ним возведение в
+# степень снова стало бы целочисленным (floor(9.0)**floor(1e9) считалось бы
+# часами), поэтому в формулу попадают только функции с результатом float
+FORMULA_FUNCTIONS = {name: float_result(function) for name, function in ALLOWED_FUNCTIONS.items()}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+CompiledFormula = collections.namedtuple('CompiledFormula', ['variables', 'function'])
+
+class FormulaError(ValueError):
+    """Ошибка разбора формулы"""
+
+class FormulaValidator:
+    """Проверяет дерево по белому списку и собирает имена переменных
+    
+    Обход итеративный, с явным счетчиком глубины: рекурсивный обход упирался в
+    предел рекурсии Python на длинных, но плоских формулах вроде a+a+...+a.
+    """
+    
+    def __init__(self):
+        self.variables = set()
+    
+    def validate(self, tree):
+        """Проверяет дерево ast.Expression; числа в нем заменяются на float"""
+        stack = [(tree.body, 1)]
+        while stack:
+            node, depth = stack.pop()
+            # compile() обходит дерево рекурсивно, поэтому глубина ограничена
+            if depth > MAX_FORMULA_DEPTH:
+                raise FormulaError("слишком глубокая вложенность формулы")
+            check = getattr(self, f"check_{type(node).__name__}", None)
+            if check is None:
+                raise FormulaError(f"недопустимая конструкция {type(node).__name__}")
+            stack.extend((child, depth + 1) for child in check(node))
+    
+    def check_BinOp(self, node):
+        if not isinstance(node.op, BINARY_OPERATORS):
+            raise FormulaError(f"недопустимая операция {type(node.op).__name__}")
+        return node.left, node.right
+    
+    def check_UnaryOp(self, node):
+        if not isinstance(node.op, UNARY_OPERATORS):
+            raise FormulaError(f"недопустимая операция {type(node.op).__name__}")
+        return node.operand,
+    
+    def check_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"недопустимая константа {node.value!r}")
+        # Все числа - float: целочисленное возведение в степень могло бы
+        # вычисляться неограниченно долго
+        node.value = float(node.value)
+        return ()
+    
+    def check_Name(self, node):
+        if node.id.startswith('_') or node.id in ALLOWED_FUNCTIONS:
+            raise FormulaError(f"недопустимое имя {node.id}")
+        if node.id not in CONSTANTS:
+            self.variables.add(node.id)
+        return ()
+    
+    def check_Call(self, node):
+        if (not isinstance(node.func, ast.Name) or node.func.id not in ALLOWED_FUNCTIONS
+                or node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args)):
+            raise FormulaError("недопустимый вызов функции")
+        return node.args
+
+@functools.lru_cache(maxsize=1024)
+def compile_formula(text):
+    """Разбирает и компилирует формулу; результат кэшируется по тексту"""
+    text = text.strip()
+    if not text or len(text) > MAX_FORMULA_LENGTH:
+        raise FormulaError("пустая или слишком длинная формула")
+    try:
+        tree = ast.parse(text, mode='eval')
+        validator = FormulaValidator()
+        validator.validate(tree)
+        variables = tuple(sorted(validator.variables))
+        
+        # Формула превращается в lambda от переменных в алфавитном порядке;
+        # у узлов из ast.parse уже есть позиции, новым они копируются
+        # (ast.fix_missing_locations обходит дерево рекурсивно)
+        arguments = ast.arguments(
+            posonlyargs=[], args=[ast.copy_location(ast.arg(arg=name), tree.body) for name in variables],
+            kwonlyargs=[], kw_defaults=[], defaults=[])
+        function_tree = ast.Expression(
+            body=ast.copy_location(ast.Lambda(args=arguments, body=tree.body), tree.body))
+        code = compile(function_tree, '<formula>', 'eval')
+    except SyntaxError:
+        raise FormulaError("синтаксическая ошибка в формуле") from None
+    except (RecursionError, MemoryError):
+        raise FormulaError("слишком глубокая вложенность формулы") from None
+    function = eval(code, {'__builtins__': {}, **FORMULA_FUNCTIONS, **CONSTANTS})
+    return CompiledFormula(variables, function)
+
+def evaluate_rows(compiled, names, rows):
+    """Лениво вычисляет формулу для наборов значений rows с порядком переменных names"""
+    try:
+        order = [names.index(name) for name in compiled.variables]
+    except ValueError:
+        missing = sorted(set(compiled.variables) - set(names))
+        raise FormulaError(f"не заданы значения переменных: {', '.join(missing)}") from None
+    
+    function = compiled.function
+    for row in rows:
+        if len(row) != len(names):
+            raise FormulaError(f"каждый набор должен содержать {len(names)} значений")
+        try:
+            yield float(function(*[row[index] for index in order]))
+        except (ArithmeticError, ValueError, TypeError):
+            # Деление на ноль, выход из области определения и т.п.
+            yield math.nan
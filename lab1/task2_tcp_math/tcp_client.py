@@ -2,11 +2,26 @@
 """
 TCP Client для задания 2
 Интерактивный клиент для выполнения математических операций
+
+Для программного использования есть функции send_pipelined, send_batch,
+send_eval, send_binary и send_udp, а также асинхронный клиент AsyncMathClient с пулом
+постоянных соединений, конвейерной отправкой запросов и ограничением числа
+запросов без ответа.
 """
 
+import asyncio
+import collections
+import random
 import socket
+import struct
 import sys
 
+# Двоичный протокол (см. tcp_server.py): кадр = длина (uint32) + нагрузка
+BINARY_FRAME = struct.Struct('!I')
+
+# Срок подключения и согласования конвейерного режима в AsyncMathClient
+HANDSHAKE_TIMEOUT = 5.0
+
 def get_operation_choice():
     """Получает выбор операции от пользователя"""
     print("\nДоступные математические операции:")
@@ -101,6 +116,315 @@ def send_request(server_host, server_port, request):
     finally:
         client_socket.close()
 
+def send_pipelined(server_host, server_port, requests, window=1000):
+    """Отправляет запросы по одному соединению в конвейерном режиме"""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        client_socket.connect((server_host, server_port))
+        client_socket.sendall(b"PIPELINE\n")
+        reader = client_socket.makefile('rb')
+        if reader.readline().strip() != b"OK":
+            raise ConnectionError("сервер не поддерживает конвейерный режим")
+        
+        # Запросы уходят пачками по window штук: так клиент и сервер не
+        # заблокируются одновременно на переполненных буферах отправки
+        responses = []
+        for start in range(0, len(requests), window):
+            batch = requests[start:start + window]
+            client_socket.sendall(("\n".join(batch) + "\n").encode('utf-8'))
+            for _ in batch:
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("соединение закрыто сервером")
+                responses.append(line.decode('utf-8').rstrip('\n'))
+        return responses
+    finally:
+        client_socket.close()
+
+def send_batch(server_host, server_port, operation, arguments):
+    """Отправляет пакетный запрос для одной операции; возвращает строку ответа"""
+    payload = ";".join(",".join(str(value) for value in args) for args in arguments)
+    return send_pipelined(server_host, server_port, [f"BATCH,{operation};{payload}"])[0]
+
+def send_eval(server_host, server_port, formula, names, rows):
+    """Вычисляет формулу для наборов значений переменных names; возвращает строку ответа"""
+    payload = "".join(";" + ",".join(str(value) for value in row) for row in rows)
+    return send_pipelined(server_host, server_port, [f"EVAL;{formula};{','.join(names)}{payload}"])[0]
+
+def send_udp(server_host, server_port, request, timeout=1.0, retries=3):
+    """Отправляет одиночный запрос по UDP; повторяет при потере, возвращает строку ответа"""
+    request_id = f"#{random.getrandbits(32)}".encode()
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        client_socket.settimeout(timeout)
+        client_socket.connect((server_host, server_port))
+        for _ in range(retries):
+            client_socket.send(request_id + b' ' + request.encode('utf-8'))
+            try:
+                while True:
+                    # Запоздавшие ответы на прошлые попытки отбрасываются по id
+                    data = client_socket.recv(65536)
+                    response_id, _, result = data.partition(b' ')
+                    if response_id == request_id:
+                        return result.decode('utf-8')
+            except socket.timeout:
+                continue
+        raise TimeoutError(f"нет ответа по UDP после {retries} попыток")
+    finally:
+        client_socket.close()
+
+def send_binary(server_host, server_port, requests, window=1000):
+    """Выполняет запросы (операция, аргументы) по двоичному протоколу; возвращает [(статус, результаты)]
+    
+    Статусы - коды двоичного протокола (STATUS_* в tcp_server.py): 0 - успех,
+    1 - нет действительных корней, 2 - недопустимые аргументы, 3 - неверное
+    число аргументов, 4 - неизвестная операция, 5 - некорректный кадр.
+    """
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        client_socket.connect((server_host, server_port))
+        client_socket.sendall(b"BINARY\n")
+        reader = client_socket.makefile('rb')
+        if reader.readline().strip() != b"OK":
+            raise ConnectionError("сервер не поддерживает двоичный протокол")
+        
+        results = []
+        for start in range(0, len(requests), window):
+            batch = requests[start:start + window]
+            frames = bytearray()
+            for operation, args in batch:
+                frames += BINARY_FRAME.pack(1 + 8 * len(args))
+                frames += struct.pack(f'!B{len(args)}d', operation, *args)
+            client_socket.sendall(frames)
+            
+            for _ in batch:
+                header = reader.read(BINARY_FRAME.size)
+                if len(header) < BINARY_FRAME.size:
+                    raise ConnectionError("соединение закрыто сервером")
+                (length,) = BINARY_FRAME.unpack(header)
+                payload = reader.read(length)
+                if len(payload) < length:
+                    raise ConnectionError("соединение закрыто сервером")
+                values = struct.unpack(f'!{(length - 1) // 8}d', payload[1:])
+                results.append((payload[0], values))
+        return results
+    finally:
+        client_socket.close()
+
+class PipelinedConnection:
+    """Постоянное соединение в конвейерном режиме; ответы сопоставляются по порядку"""
+    
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = collections.deque()  # futures в порядке отправки запросов
+        self.outgoing = []
+        self.closed = False
+        self.reader_task = asyncio.create_task(self.read_responses())
+    
+    @classmethod
+    async def open(cls, server_host, server_port, timeout=HANDSHAKE_TIMEOUT):
+        """Подключается к серверу и согласует конвейерный режим
+        
+        Сервер в режиме sequential не отвечает новому соединению, пока занят
+        другим, поэтому ожидание ответа OK ограничено timeout секундами.
+        """
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(server_host, server_port), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError("истек срок подключения к серверу")
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(b"PIPELINE\n")
+        try:
+            response = await asyncio.wait_for(reader.readline(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            writer.close()
+            raise ConnectionError("сервер не ответил на согласование конвейерного режима")
+        if response.strip() != b"OK":
+            writer.close()
+            raise ConnectionError("сервер не поддерживает конвейерный режим")
+        return cls(reader, writer)
+    
+    def send(self, request):
+        """Ставит запрос в буфер отправки; возвращает future с ответом"""
+        if self.closed:
+            raise ConnectionError("соединение закрыто")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(future)
+        # Запросы, отправленные за один проход цикла событий, уходят одной записью
+        if not self.outgoing:
+            loop.call_soon(self.flush)
+        self.outgoing.append(request)
+        return future
+    
+    def flush(self):
+        """Записывает накопленные запросы в сокет"""
+        if self.outgoing and not self.closed:
+            self.writer.write(("\n".join(self.outgoing) + "\n").encode('utf-8'))
+        self.outgoing = []
+    
+    async def read_responses(self):
+        """Читает ответы и завершает futures в порядке отправки запросов"""
+        error = ConnectionError("соединение закрыто сервером")
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                if not self.pending:
+                    error = ConnectionError("неожиданный ответ сервера")
+                    break
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(line.decode('utf-8').rstrip('\n'))
+        except (OSError, asyncio.IncompleteReadError) as e:
+            error = ConnectionError(f"ошибка соединения: {e}")
+        finally:
+            self.fail(error)
+    
+    def fail(self, error):
+        """Помечает соединение закрытым и завершает ожидающие запросы ошибкой"""
+        self.closed = True
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+        self.writer.close()
+    
+    async def close(self):
+        """Закрывает соединение"""
+        self.reader_task.cancel()
+        try:
+            await self.reader_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+class AsyncMathClient:
+    """Асинхронный клиент с пулом постоянных конвейерных соединений
+    
+    Каждый вызов calculate/submit не открывает нового соединения: запрос
+    отправляется по наименее загруженному соединению пула. Число запросов
+    без ответа ограничено max_in_flight - при его достижении submit ждет,
+    пока сервер не ответит на часть запросов.
+    
+    Пул из нескольких соединений требует сервера в режиме threads или
+    asyncio: в режиме sequential сервер обслуживает одно соединение за раз.
+    Соединения открываются по одному; если сервер не ответил на очередное за
+    handshake_timeout секунд, пул остается из уже открытых соединений.
+    """
+    
+    def __init__(self, server_host='localhost', server_port=12346, connections=4,
+                 max_in_flight=10000, handshake_timeout=HANDSHAKE_TIMEOUT):
+        self.server_host = server_host
+        self.server_port = server_port
+        self.size = connections
+        self.max_in_flight = max_in_flight
+        self.handshake_timeout = handshake_timeout
+        self.connections = []
+        self.in_flight = 0
+        self.waiters = collections.deque()  # ожидающие свободного места в окне
+        self.lock = None
+    
+    async def __aenter__(self):
+        await self.connect()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def connect(self):
+        """Открывает соединения пула по одному"""
+        self.lock = asyncio.Lock()
+        self.connections = [await self.open_connection()]
+        while len(self.connections) < self.size:
+            try:
+                self.connections.append(await self.open_connection())
+            except OSError as e:
+                # Сервер не принимает больше соединений (например, режим sequential)
+                print(f"Пул уменьшен до {len(self.connections)} соединений: {e}", file=sys.stderr)
+                self.size = len(self.connections)
+    
+    async def open_connection(self):
+        return await PipelinedConnection.open(self.server_host, self.server_port,
+                                              self.handshake_timeout)
+    
+    async def get_connection(self):
+        """Возвращает наименее загруженное соединение, заменяя закрытые"""
+        if any(connection.closed for connection in self.connections):
+            async with self.lock:
+                for index, connection in enumerate(self.connections):
+                    if connection.closed:
+                        self.connections[index] = await self.open_connection()
+        return min(self.connections, key=lambda connection: len(connection.pending))
+    
+    async def submit(self, request):
+        """Отправляет запрос и возвращает future с ответом сервера"""
+        if '\n' in request or not request.strip():
+            raise ValueError("запрос должен быть непустой строкой без перевода строки")
+        # Ограничение числа запросов без ответа (backpressure)
+        await self.acquire_slot()
+        try:
+            connection = await self.get_connection()
+            future = connection.send(request)
+        except BaseException:
+            self.release_slot()
+            raise
+        future.add_done_callback(self.release_slot)
+        
+        # Буфер отправки переполнен - ждем, пока сервер прочитает данные
+        try:
+            await connection.writer.drain()
+        except OSError:
+            pass  # ошибка будет передана в future читающей задачей
+        return future
+    
+    async def acquire_slot(self):
+        """Ждет, пока число запросов без ответа не станет меньше max_in_flight"""
+        # asyncio.Semaphore в Python 3.11 будит ожидающих за O(n), что
+        # заметно при десятках тысяч одновременных запросов
+        while self.in_flight >= self.max_in_flight:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.wake_next()
+                raise
+        self.in_flight += 1
+    
+    def release_slot(self, _future=None):
+        """Освобождает место в окне и будит следующего ожидающего"""
+        self.in_flight -= 1
+        self.wake_next()
+    
+    def wake_next(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+    
+    async def calculate(self, request):
+        """Выполняет запрос и возвращает строку ответа"""
+        return await (await self.submit(request))
+    
+    async def calculate_many(self, requests):
+        """Выполняет запросы конвейером; возвращает ответы в порядке запросов"""
+        futures = [await self.submit(request) for request in requests]
+        return await asyncio.gather(*futures)
+    
+    async def close(self):
+        """Закрывает все соединения пула"""
+        await asyncio.gather(*[connection.close() for connection in self.connections])
+        self.connections = []
+
 def main():
     # Настройки сервера
     server_host = 'localhost'
@@ -6,11 +6,100 @@ TCP Server для задания 2
 2. Решение квадратного уравнения
 3. Поиск площади трапеции
 4. Поиск площади параллелограмма
+
+Протоколы:
+- одиночный запрос: клиент отправляет "op,args", получает результат,
+  соединение закрывается
+- конвейер: клиент отправляет строку "PIPELINE\n", после чего соединение
+  остается открытым и принимает запросы "op,args\n" один за другим;
+  ответы возвращаются строками в том же порядке
+- двоичный: клиент отправляет строку "BINARY\n", после чего запросы и
+  ответы передаются кадрами с префиксом длины (см. BINARY_FRAME ниже)
+
+Пакетный запрос "BATCH,op;a,b;a,b;..." передает много наборов аргументов
+для одной операции и вычисляется векторно через NumPy. Ответ - "OK;r1;r2;..."
+(для квадратного уравнения каждый элемент - пара корней "x1,x2"), вместо
+недопустимых значений возвращается nan.
+
+Результаты одиночных запросов кэшируются (LRU) по номеру операции и
+числовым значениям аргументов. Для каждой операции и каждого класса ошибок
+собираются гистограммы задержек; запрос "STATS" возвращает их и статистику
+кэша одной строкой JSON.
+
+Запрос "EVAL;формула;x,y;1,2;3,4;..." вычисляет произвольную формулу
+(см. formula.py) для каждого набора значений переменных. Ответ - "OK;r1;r2;..."
+
+Для каждого подключения действуют сроки чтения запроса, отправки ответа и
+простоя между запросами, а также лимит размера запроса; закрытые по каждой
+причине подключения учитываются в статистике.
+
+С параметром --udp-port сервер дополнительно принимает одиночные запросы в
+датаграммах UDP: "[#id ]op,args" -> "[#id ]результат", где необязательный
+числовой id после '#' возвращается клиенту для сопоставления ответов.
 """
 
+import argparse
+import asyncio
+import bisect
+import collections
+import json
+import os
 import socket
+import struct
 import sys
 import math
+import queue
+import threading
+import time
+
+from formula import FormulaError, compile_formula, evaluate_rows
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PIPELINE_COMMAND = b"PIPELINE"
+BINARY_COMMAND = b"BINARY"
+BATCH_COMMAND = "BATCH"
+STATS_COMMAND = "STATS"
+EVAL_COMMAND = "EVAL"
+OVERLOAD_MESSAGE = "Ошибка: сервер перегружен, попробуйте позже"
+
+# UDP: запрос и ответ должны помещаться в одну датаграмму
+MAX_DATAGRAM_REQUEST = 8192
+MAX_DATAGRAM_RESPONSE = 65507
+UDP_BUFFER_SIZE = 65536
+# Признак идентификатора запроса в датаграмме: "#17 1,3,4"
+REQUEST_ID_MARKER = b'#'
+
+# Подробный журнал подключений (--verbose); по умолчанию выключен,
+# чтобы print() не замедлял обработку запросов
+VERBOSE = False
+
+# Защита от медленных и зависших клиентов (задаются параметрами, None - без срока):
+# READ_TIMEOUT - на получение запроса с момента прихода его первого байта,
+# WRITE_TIMEOUT - на отправку ответа, IDLE_TIMEOUT - простой между запросами
+READ_TIMEOUT = 10.0
+WRITE_TIMEOUT = 10.0
+IDLE_TIMEOUT = 60.0
+MAX_REQUEST_SIZE = 4 * 1024 * 1024
+
+# Двоичный протокол: кадр = длина полезной нагрузки (uint32) + нагрузка.
+# Запрос: код операции (uint8) + аргументы (float64).
+# Ответ: код статуса (uint8) + результаты (float64; для квадратного уравнения
+# с одним корнем - одно значение, с двумя - два).
+BINARY_FRAME = struct.Struct('!I')
+BINARY_HEADER = struct.Struct('!IB')
+MAX_FRAME_SIZE = 1 + 8 * 16
+FLOAT64_ARRAYS = {count: struct.Struct(f'!{count}d') for count in range(17)}
+
+STATUS_OK = 0
+STATUS_NO_REAL_ROOTS = 1
+STATUS_INVALID_ARGUMENTS = 2
+STATUS_WRONG_ARGUMENT_COUNT = 3
+STATUS_UNKNOWN_OPERATION = 4
+STATUS_BAD_FRAME = 5
 
 def pythagorean_theorem(a, b):
     """Вычисляет гипотенузу по теореме Пифагора"""
@@ -66,10 +155,374 @@ def parallelogram_area(a, h):
     except ValueError:
         return "Ошибка: введите корректные числа"
 
+def batch_pythagorean(args):
+    """Векторно вычисляет гипотенузы; для неположительных катетов - nan"""
+    a, b = args[:, 0], args[:, 1]
+    return np.where((a > 0) & (b > 0), np.hypot(a, b), np.nan)
+
+def batch_quadratic(args):
+    """Векторно решает квадратные уравнения; возвращает массив пар корней"""
+    a, b, c = args[:, 0], args[:, 1], args[:, 2]
+    discriminant = b * b - 4 * a * c
+    # Корни есть только при a != 0 и неотрицательном дискриминанте
+    valid = (a != 0) & (discriminant >= 0)
+    sqrt_d = np.sqrt(np.where(valid, discriminant, 0.0))
+    denominator = np.where(valid, 2 * a, 1.0)
+    roots = np.empty((len(args), 2))
+    roots[:, 0] = (-b + sqrt_d) / denominator
+    roots[:, 1] = (-b - sqrt_d) / denominator
+    roots[~valid] = np.nan
+    return roots
+
+def batch_trapezoid(args):
+    """Векторно вычисляет площади трапеций"""
+    a, b, h = args[:, 0], args[:, 1], args[:, 2]
+    return np.where((a > 0) & (b > 0) & (h > 0), (a + b) * h / 2, np.nan)
+
+def batch_parallelogram(args):
+    """Векторно вычисляет площади параллелограммов"""
+    a, h = args[:, 0], args[:, 1]
+    return np.where((a > 0) & (h > 0), a * h, np.nan)
+
+# Номер операции -> (число аргументов, векторная функция)
+BATCH_OPERATIONS = {
+    "1": (2, batch_pythagorean),
+    "2": (3, batch_quadratic),
+    "3": (3, batch_trapezoid),
+    "4": (2, batch_parallelogram),
+}
+
+def process_batch(data):
+    """Обрабатывает пакетный запрос "BATCH,op;a,b;a,b;..." """
+    if np is None:
+        return "Ошибка: для пакетного режима нужна библиотека numpy"
+    
+    header, _, payload = data.strip().partition(';')
+    operation = header[len(BATCH_COMMAND):].strip(' ,')
+    if operation not in BATCH_OPERATIONS:
+        return "Ошибка: неверный номер операции. Используйте 1, 2, 3 или 4"
+    arg_count, func = BATCH_OPERATIONS[operation]
+    if not payload.strip():
+        return "Ошибка: пакетный запрос не содержит наборов параметров"
+    
+    try:
+        values = np.array(payload.replace(';', ',').split(','), dtype=np.float64)
+    except ValueError:
+        return "Ошибка: введите корректные числа"
+    if values.size == 0 or values.size % arg_count:
+        return f"Ошибка: каждый набор должен содержать {arg_count} параметра"
+    
+    results = func(values.reshape(-1, arg_count))
+    if results.ndim == 2:
+        items = (f"{x1},{x2}" for x1, x2 in results.tolist())
+    else:
+        items = map(str, results.tolist())
+    return "OK;" + ";".join(items)
+
+def binary_pythagorean(a, b):
+    if a <= 0 or b <= 0:
+        return STATUS_INVALID_ARGUMENTS, ()
+    return STATUS_OK, (math.hypot(a, b),)
+
+def binary_quadratic(a, b, c):
+    if a == 0:
+        return STATUS_INVALID_ARGUMENTS, ()
+    discriminant = b * b - 4 * a * c
+    if discriminant > 0:
+        sqrt_d = math.sqrt(discriminant)
+        return STATUS_OK, ((-b + sqrt_d) / (2 * a), (-b - sqrt_d) / (2 * a))
+    elif discriminant == 0:
+        return STATUS_OK, (-b / (2 * a),)
+    return STATUS_NO_REAL_ROOTS, ()
+
+def binary_trapezoid(a, b, h):
+    if a <= 0 or b <= 0 or h <= 0:
+        return STATUS_INVALID_ARGUMENTS, ()
+    return STATUS_OK, ((a + b) * h / 2,)
+
+def binary_parallelogram(a, h):
+    if a <= 0 or h <= 0:
+        return STATUS_INVALID_ARGUMENTS, ()
+    return STATUS_OK, (a * h,)
+
+# Код операции -> (число аргументов, функция, возвращающая (статус, результаты))
+BINARY_OPERATIONS = {
+    1: (2, binary_pythagorean),
+    2: (3, binary_quadratic),
+    3: (3, binary_trapezoid),
+    4: (2, binary_parallelogram),
+}
+
+def pack_binary_response(status, values=()):
+    """Упаковывает ответ двоичного протокола в кадр"""
+    return (BINARY_HEADER.pack(1 + 8 * len(values), status)
+            + FLOAT64_ARRAYS[len(values)].pack(*values))
+
+def process_frames(buffer):
+    """Обрабатывает все полные кадры буфера; возвращает (ответы, число, причина закрытия или None)"""
+    output = bytearray()
+    handled = 0
+    offset = 0
+    while len(buffer) - offset >= BINARY_FRAME.size:
+        (length,) = BINARY_FRAME.unpack_from(buffer, offset)
+        if length < 1 or length > MAX_FRAME_SIZE or (length - 1) % 8:
+            # Границы кадров потеряны - отвечаем ошибкой и закрываем соединение
+            output += pack_binary_response(STATUS_BAD_FRAME)
+            metrics.record(None, BINARY_ERROR_CLASSES[STATUS_BAD_FRAME], 0.0)
+            del buffer[:]
+            return bytes(output), handled, 'bad_frame'
+        end = offset + BINARY_FRAME.size + length
+        if end > len(buffer):
+            break
+        
+        started = time.perf_counter()
+        operation = buffer[offset + BINARY_FRAME.size]
+        args = FLOAT64_ARRAYS[(length - 1) // 8].unpack_from(buffer, offset + BINARY_HEADER.size)
+        if operation not in BINARY_OPERATIONS:
+            status, values = STATUS_UNKNOWN_OPERATION, ()
+        else:
+            arg_count, func = BINARY_OPERATIONS[operation]
+            if len(args) != arg_count:
+                status, values = STATUS_WRONG_ARGUMENT_COUNT, ()
+            else:
+                status, values = func(*args)
+        output += pack_binary_response(status, values)
+        metrics.record(str(operation) if operation in BINARY_OPERATIONS else None,
+                       BINARY_ERROR_CLASSES.get(status), time.perf_counter() - started)
+        handled += 1
+        offset = end
+    del buffer[:offset]
+    return bytes(output), handled, None
+
+def process_eval(data):
+    """Обрабатывает запрос "EVAL;формула;x,y;1,2;3,4;..." """
+    fields = data.split(';')
+    if len(fields) < 2:
+        return "Ошибка: формат запроса EVAL;формула;переменные;значения;..."
+    names = [name.strip() for name in fields[2].split(',')] if len(fields) > 2 and fields[2].strip() else []
+    
+    try:
+        # Разобранная формула берется из кэша по ее тексту
+        compiled = compile_formula(fields[1])
+        rows = [tuple(float(value) for value in row.split(',')) for row in fields[3:]]
+        if not rows and not names:
+            rows = [()]
+        # Результаты вычисляются лениво и сразу форматируются в ответ
+        return "OK;" + ";".join(map(str, evaluate_rows(compiled, names, rows)))
+    except FormulaError as e:
+        return f"Ошибка: {e}"
+    except ValueError:
+        return "Ошибка: введите корректные числа"
+
+class ResultCache:
+    """Потокобезопасный LRU-кэш результатов со статистикой попаданий"""
+    
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Возвращает результат из кэша или None"""
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+    
+    def put(self, key, result):
+        """Сохраняет результат, вытесняя самую давнюю запись"""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self):
+        """Возвращает словарь со статистикой кэша"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+result_cache = ResultCache()
+
+# Верхние границы корзин гистограммы задержек, мкс
+LATENCY_BUCKETS_US = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.total = 0
+        self.sum_us = 0.0
+    
+    def add(self, latency_us):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_US, latency_us)] += 1
+        self.total += 1
+        self.sum_us += latency_us
+    
+    def percentile(self, percent):
+        """Оценивает перцентиль верхней границей корзины"""
+        threshold = self.total * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= threshold:
+                return LATENCY_BUCKETS_US[index] if index < len(LATENCY_BUCKETS_US) else None
+        return 0
+    
+    def snapshot(self):
+        buckets = {f"le_{bound}us": count for bound, count in zip(LATENCY_BUCKETS_US, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.total,
+            'mean_us': round(self.sum_us / self.total, 2) if self.total else 0.0,
+            'p50_us': self.percentile(50),
+            'p95_us': self.percentile(95),
+            'p99_us': self.percentile(99),
+            'buckets': buckets,
+        }
+
+class ServerMetrics:
+    """Счетчики и гистограммы задержек по операциям и классам ошибок"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.operations = collections.defaultdict(LatencyHistogram)
+        self.errors = collections.defaultdict(LatencyHistogram)
+        self.closes = collections.Counter()
+    
+    def record(self, operation, error, seconds):
+        """Учитывает запрос: операция (или None), класс ошибки (или None), время"""
+        latency_us = seconds * 1e6
+        with self.lock:
+            if operation is not None:
+                self.operations[operation].add(latency_us)
+            if error is not None:
+                self.errors[error].add(latency_us)
+    
+    def record_close(self, reason):
+        """Учитывает закрытие подключения по причине reason"""
+        with self.lock:
+            self.closes[reason] += 1
+    
+    def snapshot(self):
+        with self.lock:
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'operations': {name: h.snapshot() for name, h in sorted(self.operations.items())},
+                'errors': {name: h.snapshot() for name, h in sorted(self.errors.items())},
+                'closes': dict(sorted(self.closes.items())),
+                'cache': result_cache.stats(),
+                'formula_cache': compile_formula.cache_info()._asdict(),
+            }
+
+metrics = ServerMetrics()
+
+# Классы ошибок двоичного протокола
+BINARY_ERROR_CLASSES = {
+    STATUS_INVALID_ARGUMENTS: 'invalid_arguments',
+    STATUS_WRONG_ARGUMENT_COUNT: 'invalid_arguments',
+    STATUS_UNKNOWN_OPERATION: 'unknown_operation',
+    STATUS_BAD_FRAME: 'bad_frame',
+}
+KNOWN_OPERATIONS = {"1", "2", "3", "4", "batch", "eval"}
+
+def format_stats():
+    """Возвращает статистику сервера одной строкой JSON"""
+    return json.dumps(metrics.snapshot(), ensure_ascii=False, separators=(',', ':'))
+
+def dump_stats_periodically(path, interval):
+    """Периодически записывает статистику в файл (в отдельном потоке)"""
+    while True:
+        time.sleep(interval)
+        try:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(metrics.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Ошибка записи статистики в {path}: {e}")
+
+def log(message):
+    """Выводит сообщение журнала подключений в режиме --verbose"""
+    if VERBOSE:
+        print(message)
+
+def make_cache_key(parts):
+    """Нормализует запрос в ключ кэша или возвращает None для нечисловых аргументов"""
+    try:
+        # "+ 0.0" превращает -0.0 в 0.0, чтобы ключ однозначно задавал результат
+        args = tuple(float(part) + 0.0 for part in parts[1:])
+    except ValueError:
+        return None
+    return (parts[0].strip(), args)
+
 def process_request(data):
     """Обрабатывает запрос от клиента"""
+    command = data.strip()
+    if command.upper() == STATS_COMMAND:
+        return format_stats()
+    
+    started = time.perf_counter()
+    operation = None
+    error = None
+    try:
+        if command.startswith(BATCH_COMMAND):
+            operation = "batch"
+            result = process_batch(command)
+        elif command.startswith(EVAL_COMMAND):
+            operation = "eval"
+            result = process_eval(command)
+        else:
+            parts = command.split(',')
+            operation = parts[0].strip()
+            result = cached_calculate(parts)
+        
+        if result.startswith("Ошибка"):
+            error = 'invalid_arguments' if operation in KNOWN_OPERATIONS else 'unknown_operation'
+    
+    except Exception as e:
+        result = f"Ошибка обработки запроса: {str(e)}"
+        error = 'exception'
+    
+    metrics.record(operation if operation in KNOWN_OPERATIONS else None, error,
+                   time.perf_counter() - started)
+    return result
+
+def cached_calculate(parts):
+    """Выполняет операцию с использованием кэша результатов"""
+    key = make_cache_key(parts)
+    if key is None:
+        return calculate(parts)
+    
+    result = result_cache.get(key)
+    if result is None:
+        result = calculate([key[0], *key[1]])
+        result_cache.put(key, result)
+    return result
+
+def calculate(parts):
+    """Выполняет операцию по номеру и списку аргументов"""
     try:
-        parts = data.strip().split(',')
         operation = parts[0].strip()
         
         if operation == "1":  # Теорема Пифагора
@@ -98,52 +551,483 @@ def process_request(data):
     except Exception as e:
         return f"Ошибка обработки запроса: {str(e)}"
 
-def main():
-    # Создаем TCP сокет
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    
-    # Настройки сервера
-    host = 'localhost'
-    port = 12346
+class ClientClosed(Exception):
+    """Подключение закрывается сервером по причине reason (учитывается в статистике)"""
     
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def receive(client_socket, size, timeout, reason):
+    """recv со сроком ожидания; по истечении срока - ClientClosed(reason)"""
+    client_socket.settimeout(timeout)
+    try:
+        return client_socket.recv(size)
+    except socket.timeout:
+        raise ClientClosed(reason) from None
+
+def send(client_socket, data):
+    """sendall со сроком WRITE_TIMEOUT на отправку всех данных"""
+    client_socket.settimeout(WRITE_TIMEOUT)
+    try:
+        client_socket.sendall(data)
+    except socket.timeout:
+        raise ClientClosed('write_timeout') from None
+
+def next_read_timeout(buffer, request_started, handled):
+    """Возвращает (начало текущего запроса, срок следующего чтения, причина по истечении)"""
+    # Пустой буфер - клиент простаивает между запросами; иначе идет прием
+    # запроса, и срок отсчитывается от момента прихода его первых байтов
+    if not buffer:
+        return None, IDLE_TIMEOUT, 'idle_timeout'
+    now = time.monotonic()
+    if request_started is None or handled:
+        request_started = now
+    if READ_TIMEOUT is None:
+        return request_started, None, 'read_timeout'
+    remaining = READ_TIMEOUT - (now - request_started)
+    if remaining <= 0:
+        raise ClientClosed('read_timeout')
+    return request_started, remaining, 'read_timeout'
+
+def handle_client(client_socket, client_address):
+    """Обслуживает одно подключение в одиночном, конвейерном или двоичном режиме"""
+    reason = 'completed'
     try:
-        # Привязываем сокет к адресу и порту
-        server_socket.bind((host, port))
-        server_socket.listen(1)
-        print(f"TCP Server запущен на {host}:{port}")
-        print("Доступные операции:")
-        print("1 - Теорема Пифагора (катет1, катет2)")
-        print("2 - Квадратное уравнение (a, b, c)")
-        print("3 - Площадь трапеции (основание1, основание2, высота)")
-        print("4 - Площадь параллелограмма (основание, высота)")
-        print("Ожидание подключений...")
+        # Получаем данные от клиента
+        data = receive(client_socket, 1024, READ_TIMEOUT, 'read_timeout')
+        if not data:
+            reason = 'client_closed'
+            return
         
+        # Команда согласования протокола могла прийти не целиком - дочитываем ее
+        while is_partial_command(data):
+            chunk = receive(client_socket, 1024, READ_TIMEOUT, 'read_timeout')
+            if not chunk:
+                break
+            data += chunk
+        
+        protocol = find_stream_protocol(data)
+        if protocol is not None:
+            serve_stream(client_socket, client_address, data, *protocol)
+            reason = 'client_closed'
+            return
+        
+        data = data.decode('utf-8')
+        log(f"Получен запрос: {data}")
+        
+        # Обрабатываем запрос
+        result = process_request(data)
+        log(f"Результат: {result}")
+        
+        # Отправляем результат клиенту
+        send(client_socket, result.encode('utf-8'))
+    
+    except ClientClosed as e:
+        reason = e.reason
+    except OSError as e:
+        reason = 'reset'
+        log(f"Ошибка соединения с {client_address}: {e}")
+    except Exception as e:
+        reason = 'error'
+        error_msg = f"Ошибка обработки клиента: {str(e)}"
+        print(error_msg)
+        try:
+            client_socket.send(error_msg.encode('utf-8'))
+        except OSError:
+            pass
+    
+    finally:
+        # Закрываем соединение с клиентом
+        client_socket.close()
+        metrics.record_close(reason)
+        log(f"Соединение с {client_address} закрыто ({reason})")
+
+def process_lines(buffer):
+    """Обрабатывает все полные строки буфера и удаляет их из него"""
+    # Запросы могут приходить по несколько за один recv или разрываться
+    # между несколькими recv: обрабатываем только полные строки
+    responses = []
+    start = 0
+    while True:
+        end = buffer.find(b'\n', start)
+        if end < 0:
+            break
+        line = buffer[start:end].decode('utf-8', 'replace').strip()
+        start = end + 1
+        if line:
+            responses.append(process_request(line))
+    del buffer[:start]
+    return responses
+
+def process_pipeline(buffer):
+    """Обрабатывает полные строки буфера; возвращает (ответы, число, причина закрытия или None)"""
+    responses = process_lines(buffer)
+    output = ("\n".join(responses) + "\n").encode('utf-8') if responses else b""
+    if len(buffer) > MAX_REQUEST_SIZE:
+        return output + "Ошибка: слишком длинный запрос\n".encode('utf-8'), len(responses), 'too_large'
+    return output, len(responses), None
+
+# Команда согласования протокола -> функция обработки накопленного буфера
+STREAM_PROTOCOLS = {
+    PIPELINE_COMMAND: process_pipeline,
+    BINARY_COMMAND: process_frames,
+}
+
+def is_partial_command(data):
+    """Проверяет, что данные - начало команды согласования, пришедшей не целиком"""
+    return any(len(data) < len(command) and command.startswith(data)
+               for command in STREAM_PROTOCOLS)
+
+def find_stream_protocol(data):
+    """Возвращает (команда, обработчик) для согласованного протокола или None"""
+    for command, process in STREAM_PROTOCOLS.items():
+        if data.startswith(command):
+            return command, process
+    return None
+
+def serve_stream(client_socket, client_address, buffer, command, process):
+    """Обслуживает долгоживущее соединение в конвейерном или двоичном режиме"""
+    buffer = bytearray(buffer)
+    # Первая строка - сама команда согласования
+    handshake_end = buffer.find(b'\n')
+    while handshake_end < 0:
+        if len(buffer) > MAX_REQUEST_SIZE:
+            raise ClientClosed('too_large')
+        chunk = receive(client_socket, 65536, READ_TIMEOUT, 'read_timeout')
+        if not chunk:
+            return
+        buffer += chunk
+        handshake_end = buffer.find(b'\n')
+    del buffer[:handshake_end + 1]
+    send(client_socket, b"OK\n")
+    
+    handled = 0
+    request_started = None
+    try:
+        while True:
+            # Ответы на все полные запросы из буфера отправляем одним sendall
+            output, count, close_reason = process(buffer)
+            handled += count
+            if output:
+                send(client_socket, output)
+            if close_reason:
+                raise ClientClosed(close_reason)
+            
+            request_started, timeout, reason = next_read_timeout(buffer, request_started, count)
+            chunk = receive(client_socket, 65536, timeout, reason)
+            if not chunk:
+                break
+            buffer += chunk
+    finally:
+        log(f"{command.decode()} {client_address}: обработано запросов: {handled}")
+
+def reject_client(client_socket):
+    """Отказывает в обслуживании при превышении лимита подключений"""
+    metrics.record(None, 'overloaded', 0.0)
+    metrics.record_close('overloaded')
+    try:
+        client_socket.send(OVERLOAD_MESSAGE.encode('utf-8'))
+    except OSError:
+        pass
+    finally:
+        client_socket.close()
+
+def process_datagram(data):
+    """Обрабатывает датаграмму "[#id ]запрос" и возвращает ответ "[#id ]результат" """
+    # Идентификатор отмечен явно: '#' не начинает ни один запрос, поэтому
+    # запрос вида "1 ,3,4" не принимается за идентификатор
+    prefix, body = b'', data
+    if data.startswith(REQUEST_ID_MARKER):
+        request_id, separator, body = data[len(REQUEST_ID_MARKER):].partition(b' ')
+        if separator and request_id.isdigit():
+            prefix = REQUEST_ID_MARKER + request_id + b' '
+        else:
+            body = None
+    
+    if len(data) > MAX_DATAGRAM_REQUEST:
+        metrics.record(None, 'oversized', 0.0)
+        result = (f"Ошибка: датаграмма {len(data)} байт больше допустимых "
+                  f"{MAX_DATAGRAM_REQUEST}, используйте TCP")
+    elif body is None:
+        metrics.record(None, 'bad_frame', 0.0)
+        result = "Ошибка: идентификатор запроса должен иметь вид #число и отделяться пробелом"
+    else:
+        result = process_request(body.decode('utf-8', 'replace').strip())
+    
+    response = prefix + result.encode('utf-8')
+    if len(response) > MAX_DATAGRAM_RESPONSE:
+        metrics.record(None, 'oversized', 0.0)
+        response = prefix + "Ошибка: ответ не помещается в датаграмму, используйте TCP".encode('utf-8')
+    return response
+
+def serve_udp(host, port):
+    """Отвечает на одиночные запросы по UDP (в отдельном потоке)"""
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.bind((host, port))
+    print(f"UDP запущен на {host}:{port}")
+    
+    try:
+        while True:
+            try:
+                data, client_address = udp_socket.recvfrom(UDP_BUFFER_SIZE)
+                udp_socket.sendto(process_datagram(data), client_address)
+            except OSError as e:
+                # Ошибка одного клиента (например, ICMP port unreachable) не
+                # должна останавливать прием остальных датаграмм
+                log(f"Ошибка UDP: {e}")
+    finally:
+        udp_socket.close()
+
+def print_banner(host, port, mode):
+    print(f"TCP Server ({mode}) запущен на {host}:{port}")
+    print("Доступные операции:")
+    print("1 - Теорема Пифагора (катет1, катет2)")
+    print("2 - Квадратное уравнение (a, b, c)")
+    print("3 - Площадь трапеции (основание1, основание2, высота)")
+    print("4 - Площадь параллелограмма (основание, высота)")
+    print("Ожидание подключений...")
+
+def create_server_socket(host, port, backlog):
+    """Создает слушающий сокет с заданной очередью подключений"""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(backlog)
+    return server_socket
+
+def run_sequential(host, port, backlog):
+    """Обслуживает клиентов по очереди в одном потоке"""
+    # Создаем TCP сокет
+    server_socket = create_server_socket(host, port, backlog)
+    print_banner(host, port, "sequential")
+    
+    try:
         while True:
             # Принимаем подключение
             client_socket, client_address = server_socket.accept()
-            print(f"Подключен клиент: {client_address}")
-            
+            log(f"Подключен клиент: {client_address}")
+            handle_client(client_socket, client_address)
+    finally:
+        # Закрываем серверный сокет
+        server_socket.close()
+
+def run_threaded(host, port, backlog, workers, max_connections):
+    """Обслуживает клиентов пулом потоков с ограничением числа подключений"""
+    server_socket = create_server_socket(host, port, backlog)
+    # Подключения сверх числа потоков ждут в очереди пула, но не больше
+    # max_connections одновременно; остальным сразу отказываем
+    slots = threading.BoundedSemaphore(max_connections)
+    pending = queue.Queue()
+    print_banner(host, port, f"threads: {workers}, max connections: {max_connections}")
+    
+    def worker():
+        while True:
+            client_socket, client_address = pending.get()
             try:
-                # Получаем данные от клиента
-                data = client_socket.recv(1024).decode('utf-8')
-                print(f"Получен запрос: {data}")
-                
-                # Обрабатываем запрос
-                result = process_request(data)
-                print(f"Результат: {result}")
-                
-                # Отправляем результат клиенту
-                client_socket.send(result.encode('utf-8'))
-                
-            except Exception as e:
-                error_msg = f"Ошибка обработки клиента: {str(e)}"
-                print(error_msg)
-                client_socket.send(error_msg.encode('utf-8'))
-            
+                handle_client(client_socket, client_address)
             finally:
-                # Закрываем соединение с клиентом
-                client_socket.close()
-                print(f"Соединение с {client_address} закрыто")
+                slots.release()
+    
+    # Потоки-демоны не мешают завершению сервера по Ctrl+C
+    for _ in range(workers):
+        threading.Thread(target=worker, daemon=True).start()
+    
+    try:
+        while True:
+            client_socket, client_address = server_socket.accept()
+            if not slots.acquire(blocking=False):
+                log(f"Отказано в подключении {client_address}: превышен лимит")
+                reject_client(client_socket)
+                continue
+            log(f"Подключен клиент: {client_address}")
+            pending.put((client_socket, client_address))
+    finally:
+        server_socket.close()
+
+async def receive_async(reader, size, timeout, reason):
+    """Асинхронная версия receive"""
+    try:
+        return await asyncio.wait_for(reader.read(size), timeout)
+    except asyncio.TimeoutError:
+        raise ClientClosed(reason) from None
+
+async def send_async(writer, data):
+    """Асинхронная версия send"""
+    writer.write(data)
+    try:
+        await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ClientClosed('write_timeout') from None
+
+async def handle_client_async(reader, writer):
+    """Асинхронная версия handle_client для режима asyncio"""
+    client_address = writer.get_extra_info('peername')
+    reason = 'completed'
+    try:
+        data = await receive_async(reader, 1024, READ_TIMEOUT, 'read_timeout')
+        if not data:
+            reason = 'client_closed'
+            return
+        while is_partial_command(data):
+            chunk = await receive_async(reader, 1024, READ_TIMEOUT, 'read_timeout')
+            if not chunk:
+                break
+            data += chunk
+        
+        protocol = find_stream_protocol(data)
+        if protocol is not None:
+            await serve_stream_async(reader, writer, client_address, data, *protocol)
+            reason = 'client_closed'
+            return
+        
+        data = data.decode('utf-8')
+        log(f"Получен запрос: {data}")
+        result = process_request(data)
+        log(f"Результат: {result}")
+        await send_async(writer, result.encode('utf-8'))
+    
+    except ClientClosed as e:
+        reason = e.reason
+    except OSError as e:
+        reason = 'reset'
+        log(f"Ошибка соединения с {client_address}: {e}")
+    except Exception as e:
+        reason = 'error'
+        error_msg = f"Ошибка обработки клиента: {str(e)}"
+        print(error_msg)
+        try:
+            writer.write(error_msg.encode('utf-8'))
+        except OSError:
+            pass
+    
+    finally:
+        if reason == 'write_timeout':
+            # Неотправленные данные отбрасываются: медленный клиент не держит память
+            writer.transport.abort()
+        else:
+            writer.close()
+        metrics.record_close(reason)
+        log(f"Соединение с {client_address} закрыто ({reason})")
+
+async def serve_stream_async(reader, writer, client_address, buffer, command, process):
+    """Асинхронная версия serve_stream"""
+    buffer = bytearray(buffer)
+    handshake_end = buffer.find(b'\n')
+    while handshake_end < 0:
+        if len(buffer) > MAX_REQUEST_SIZE:
+            raise ClientClosed('too_large')
+        chunk = await receive_async(reader, 65536, READ_TIMEOUT, 'read_timeout')
+        if not chunk:
+            return
+        buffer += chunk
+        handshake_end = buffer.find(b'\n')
+    del buffer[:handshake_end + 1]
+    writer.write(b"OK\n")
+    
+    handled = 0
+    request_started = None
+    try:
+        while True:
+            output, count, close_reason = process(buffer)
+            handled += count
+            if output:
+                await send_async(writer, output)
+            if close_reason:
+                raise ClientClosed(close_reason)
+            
+            request_started, timeout, reason = next_read_timeout(buffer, request_started, count)
+            chunk = await receive_async(reader, 65536, timeout, reason)
+            if not chunk:
+                break
+            buffer += chunk
+    finally:
+        log(f"{command.decode()} {client_address}: обработано запросов: {handled}")
+
+async def serve_asyncio(host, port, backlog, max_connections):
+    """Обслуживает клиентов в цикле событий asyncio"""
+    active = 0
+    
+    async def on_connect(reader, writer):
+        nonlocal active
+        client_address = writer.get_extra_info('peername')
+        if active >= max_connections:
+            log(f"Отказано в подключении {client_address}: превышен лимит")
+            metrics.record(None, 'overloaded', 0.0)
+            metrics.record_close('overloaded')
+            writer.write(OVERLOAD_MESSAGE.encode('utf-8'))
+            writer.close()
+            return
+        active += 1
+        log(f"Подключен клиент: {client_address}")
+        try:
+            await handle_client_async(reader, writer)
+        finally:
+            active -= 1
+    
+    server = await asyncio.start_server(on_connect, host, port, backlog=backlog,
+                                        reuse_address=True)
+    print_banner(host, port, f"asyncio, max connections: {max_connections}")
+    async with server:
+        await server.serve_forever()
+
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="TCP Math Server")
+    parser.add_argument('--mode', choices=['sequential', 'threads', 'asyncio'],
+                        default='sequential', help="модель обработки подключений")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12346)
+    parser.add_argument('--backlog', type=int, default=128,
+                        help="длина очереди ожидающих подключений (listen)")
+    parser.add_argument('--workers', type=int, default=16,
+                        help="число потоков в режиме threads")
+    parser.add_argument('--max-connections', type=int, default=256,
+                        help="максимум одновременно обслуживаемых подключений")
+    parser.add_argument('--read-timeout', type=float, default=10.0,
+                        help="срок получения запроса в секундах (0 - без срока)")
+    parser.add_argument('--write-timeout', type=float, default=10.0,
+                        help="срок отправки ответа в секундах (0 - без срока)")
+    parser.add_argument('--idle-timeout', type=float, default=60.0,
+                        help="срок простоя соединения между запросами (0 - без срока)")
+    parser.add_argument('--max-request-size', type=int, default=4 * 1024 * 1024,
+                        help="максимальный размер запроса в байтах")
+    parser.add_argument('--udp-port', type=int, default=0,
+                        help="порт для одиночных запросов по UDP (0 - выключено)")
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help="размер LRU-кэша результатов (0 - без кэша)")
+    parser.add_argument('--stats-file',
+                        help="файл, в который периодически записывается статистика")
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help="период записи статистики в секундах")
+    parser.add_argument('--verbose', action='store_true',
+                        help="выводить журнал подключений и запросов")
+    return parser.parse_args()
+
+def main():
+    global VERBOSE, READ_TIMEOUT, WRITE_TIMEOUT, IDLE_TIMEOUT, MAX_REQUEST_SIZE
+    args = parse_args()
+    VERBOSE = args.verbose
+    READ_TIMEOUT = args.read_timeout or None
+    WRITE_TIMEOUT = args.write_timeout or None
+    IDLE_TIMEOUT = args.idle_timeout or None
+    MAX_REQUEST_SIZE = args.max_request_size
+    result_cache.max_size = args.cache_size
+    if args.stats_file:
+        threading.Thread(target=dump_stats_periodically,
+                         args=(args.stats_file, args.stats_interval), daemon=True).start()
+    if args.udp_port:
+        threading.Thread(target=serve_udp, args=(args.host, args.udp_port), daemon=True).start()
+    
+    try:
+        if args.mode == 'threads':
+            run_threaded(args.host, args.port, args.backlog, args.workers,
+                         args.max_connections)
+        elif args.mode == 'asyncio':
+            asyncio.run(serve_asyncio(args.host, args.port, args.backlog,
+                                      args.max_connections))
+        else:
+            run_sequential(args.host, args.port, args.backlog)
     
     except KeyboardInterrupt:
         print("\nСервер остановлен пользователем")
@@ -152,8 +1036,6 @@ def main():
         sys.exit(1)
     
     finally:
-        # Закрываем серверный сокет
-        server_socket.close()
         print("Сервер завершил работу")
 
 if __name__ == "__main__":
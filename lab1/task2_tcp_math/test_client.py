@@ -1,10 +1,32 @@
 #!/usr/bin/env python3
 """
 Тестовый клиент для автоматической проверки всех математических операций
+
+Режимы работы:
+test  - отправляет набор примеров и проверяет, что сервер отвечает (по умолчанию)
+bench - нагрузочный тест: несколько параллельных клиентов для каждой операции
+        измеряют запросы в секунду и перцентили задержки в режимах
+        одиночных соединений, конвейера, двоичного протокола и пакетных запросов
+        (режим async - асинхронный клиент AsyncMathClient - включается через --modes)
 """
 
+import argparse
+import asyncio
+import random
 import socket
+import struct
 import sys
+import threading
+import time
+
+from tcp_client import BINARY_FRAME, AsyncMathClient
+
+OPERATIONS = {
+    1: ("Теорема Пифагора", 2),
+    2: ("Квадратное уравнение", 3),
+    3: ("Площадь трапеции", 3),
+    4: ("Площадь параллелограмма", 2),
+}
 
 def send_test_request(server_host, server_port, request, description):
     """Отправляет тестовый запрос и выводит результат"""
@@ -26,10 +48,8 @@ def send_test_request(server_host, server_port, request, description):
         print(f"Ошибка теста '{description}': {e}")
         return False
 
-def main():
-    server_host = 'localhost'
-    server_port = 12346
-    
+def run_tests(server_host, server_port):
+    """Отправляет набор тестовых запросов"""
     print("=== Тестирование TCP Math Server ===")
     
     # Тестовые случаи
@@ -60,5 +80,226 @@ def main():
     else:
         print("❌ Некоторые тесты не прошли")
 
+def percentile(sorted_values, percent):
+    """Возвращает перцентиль отсортированного списка (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def make_arguments(operation, count, rng):
+    """Генерирует наборы аргументов; при одинаковом seed - одни и те же"""
+    arg_count = OPERATIONS[operation][1]
+    return [tuple(round(rng.uniform(1, 100), 3) for _ in range(arg_count))
+            for _ in range(count)]
+
+def to_text(operation, args):
+    return f"{operation}," + ",".join(str(value) for value in args)
+
+def open_stream(server_host, server_port, command):
+    """Открывает соединение и согласует конвейерный или двоичный протокол"""
+    client_socket = socket.create_connection((server_host, server_port))
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    client_socket.sendall(command + b"\n")
+    reader = client_socket.makefile('rb')
+    if reader.readline().strip() != b"OK":
+        raise ConnectionError(f"сервер не поддерживает режим {command.decode()}")
+    return client_socket, reader
+
+def bench_oneshot(server_host, server_port, operation, arguments, window):
+    """Одно соединение на каждый запрос; возвращает (число запросов, задержки)"""
+    latencies = []
+    for args in arguments:
+        request = to_text(operation, args).encode('utf-8')
+        started = time.perf_counter()
+        client_socket = socket.create_connection((server_host, server_port))
+        try:
+            client_socket.sendall(request)
+            client_socket.recv(1024)
+        finally:
+            client_socket.close()
+        latencies.append(time.perf_counter() - started)
+    return len(arguments), latencies
+
+def bench_pipelined(server_host, server_port, operation, arguments, window):
+    """Конвейер по одному соединению, запросы отправляются пачками по window"""
+    client_socket, reader = open_stream(server_host, server_port, b"PIPELINE")
+    latencies = []
+    try:
+        for start in range(0, len(arguments), window):
+            batch = arguments[start:start + window]
+            payload = "".join(to_text(operation, args) + "\n" for args in batch)
+            sent_at = time.perf_counter()
+            client_socket.sendall(payload.encode('utf-8'))
+            for _ in batch:
+                if not reader.readline():
+                    raise ConnectionError("соединение закрыто сервером")
+                latencies.append(time.perf_counter() - sent_at)
+    finally:
+        client_socket.close()
+    return len(arguments), latencies
+
+def bench_binary(server_host, server_port, operation, arguments, window):
+    """Двоичный протокол по одному соединению, кадры пачками по window"""
+    client_socket, reader = open_stream(server_host, server_port, b"BINARY")
+    request_format = struct.Struct(f'!IB{OPERATIONS[operation][1]}d')
+    latencies = []
+    try:
+        for start in range(0, len(arguments), window):
+            batch = arguments[start:start + window]
+            payload = b"".join(request_format.pack(request_format.size - BINARY_FRAME.size,
+                                                   operation, *args) for args in batch)
+            sent_at = time.perf_counter()
+            client_socket.sendall(payload)
+            for _ in batch:
+                header = reader.read(BINARY_FRAME.size)
+                if len(header) < BINARY_FRAME.size:
+                    raise ConnectionError("соединение закрыто сервером")
+                reader.read(BINARY_FRAME.unpack(header)[0])
+                latencies.append(time.perf_counter() - sent_at)
+    finally:
+        client_socket.close()
+    return len(arguments), latencies
+
+def bench_batch(server_host, server_port, operation, arguments, window):
+    """Пакетные запросы BATCH по window наборов; задержка - на весь пакет"""
+    client_socket, reader = open_stream(server_host, server_port, b"PIPELINE")
+    latencies = []
+    try:
+        for start in range(0, len(arguments), window):
+            batch = arguments[start:start + window]
+            payload = ";".join(",".join(str(value) for value in args) for args in batch)
+            sent_at = time.perf_counter()
+            client_socket.sendall(f"BATCH,{operation};{payload}\n".encode('utf-8'))
+            response = reader.readline()
+            if not response.startswith(b"OK"):
+                raise ConnectionError(f"ошибка пакетного запроса: {response[:80]!r}")
+            latencies.append(time.perf_counter() - sent_at)
+    finally:
+        client_socket.close()
+    return len(arguments), latencies
+
+def bench_async(server_host, server_port, operation, arguments, window):
+    """Асинхронный клиент с одним соединением и окном window запросов без ответа"""
+    latencies = []
+    
+    async def run():
+        async with AsyncMathClient(server_host, server_port, connections=1,
+                                   max_in_flight=window) as client:
+            futures = []
+            for args in arguments:
+                sent_at = time.perf_counter()
+                future = await client.submit(to_text(operation, args))
+                future.add_done_callback(
+                    lambda _, sent_at=sent_at: latencies.append(time.perf_counter() - sent_at))
+                futures.append(future)
+            await asyncio.gather(*futures)
+    
+    asyncio.run(run())
+    return len(arguments), latencies
+
+BENCH_MODES = {
+    'oneshot': bench_oneshot,
+    'pipelined': bench_pipelined,
+    'binary': bench_binary,
+    'batch': bench_batch,
+    'async': bench_async,
+}
+
+def run_concurrent(bench, server_host, server_port, operation, workloads, window):
+    """Запускает клиентов одновременно; возвращает (запросов, секунд, задержки, ошибок)"""
+    results = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(workloads) + 1)
+    
+    def client(arguments):
+        barrier.wait()
+        try:
+            result = bench(server_host, server_port, operation, arguments, window)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+            return
+        with lock:
+            results.append(result)
+    
+    threads = [threading.Thread(target=client, args=(arguments,)) for arguments in workloads]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    completed = sum(count for count, _ in results)
+    latencies = sorted(latency for _, values in results for latency in values)
+    return completed, elapsed, latencies, errors
+
+def run_benchmark(args):
+    """Запускает нагрузочный тест по всем режимам и операциям"""
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in BENCH_MODES]
+    if unknown:
+        print(f"Ошибка: неизвестные режимы {', '.join(unknown)}")
+        sys.exit(1)
+    
+    print(f"=== Нагрузочный тест TCP Math Server {args.host}:{args.port} ===")
+    print(f"Клиентов: {args.clients}, запросов на клиента: {args.requests} "
+          f"(oneshot: {args.oneshot_requests}), окно: {args.window}, "
+          f"размер пакета: {args.batch_size}, seed: {args.seed}")
+    print(f"{'режим':<10} {'операция':<24} {'запросов':>9} {'запр/с':>11} "
+          f"{'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    
+    for mode in modes:
+        for operation, (name, _) in OPERATIONS.items():
+            # Одинаковый seed дает одинаковые данные для сравнения запусков
+            rng = random.Random(f"{args.seed}-{operation}")
+            count = args.oneshot_requests if mode == 'oneshot' else args.requests
+            workloads = [make_arguments(operation, count, rng) for _ in range(args.clients)]
+            window = args.batch_size if mode == 'batch' else args.window
+            
+            completed, elapsed, latencies, errors = run_concurrent(
+                BENCH_MODES[mode], args.host, args.port, operation, workloads, window)
+            
+            print(f"{mode:<10} {name:<24} {completed:>9} {completed / elapsed:>11.0f} "
+                  f"{percentile(latencies, 50) * 1000:>9.3f} "
+                  f"{percentile(latencies, 95) * 1000:>9.3f} "
+                  f"{percentile(latencies, 99) * 1000:>9.3f}")
+            if errors:
+                print(f"  ошибок клиентов: {len(errors)} (первая: {errors[0]})")
+
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="TCP Math Server test client")
+    parser.add_argument('--mode', choices=['test', 'bench'], default='test',
+                        help="проверка примеров или нагрузочный тест")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12346)
+    parser.add_argument('--modes', default='oneshot,pipelined,binary,batch',
+                        help="режимы нагрузочного теста через запятую")
+    parser.add_argument('--clients', type=int, default=8,
+                        help="число параллельных клиентов")
+    parser.add_argument('--requests', type=int, default=20000,
+                        help="запросов на клиента для конвейера, двоичного и пакетного режимов")
+    parser.add_argument('--oneshot-requests', type=int, default=500,
+                        help="запросов на клиента в режиме одиночных соединений")
+    parser.add_argument('--window', type=int, default=100,
+                        help="число запросов в одной отправке конвейера")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="наборов аргументов в одном запросе BATCH")
+    parser.add_argument('--seed', type=int, default=42,
+                        help="seed генератора аргументов")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.mode == 'bench':
+        run_benchmark(args)
+    else:
+        run_tests(args.host, args.port)
+
 if __name__ == "__main__":
     main()
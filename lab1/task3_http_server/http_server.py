@@ -3,12 +3,117 @@
 HTTP Server для задания 3
 Реализует простой веб-сервер с использованием библиотеки socket
 Отдает HTML-страницу из файла index.html
+
+Готовые к отправке тела ответов хранятся в LRU-кэше с ограничением по объему
+памяти (--cache-size). Запись сверяется с файлом по mtime, размеру и inode не
+чаще раза в --cache-check-interval секунд, поэтому часто запрашиваемые
+страницы отдаются без обращения к файловой системе.
+
+Файлы отдаются в двоичном виде. Файлы больше --sendfile-threshold не
+кэшируются и не читаются в память: после заголовков они передаются
+системным вызовом sendfile прямо из открытого файла.
+
+Соединения постоянные (HTTP/1.1 keep-alive): каждое обслуживается в своем
+потоке, запросы читаются из буфера один за другим, в том числе присланные
+конвейером без ожидания ответов; ответы отправляются в порядке запросов.
+Соединение закрывается по заголовку "Connection: close", после простоя
+--keep-alive-timeout секунд или после --max-requests запросов.
+
+Ответы с файлами содержат ETag (по inode, размеру и времени изменения),
+Last-Modified и Cache-Control. На условный запрос с совпадающим
+If-None-Match или If-Modified-Since сервер отвечает 304 без тела.
+
+Текстовые файлы (HTML, CSS, JS) отдаются сжатыми gzip или brotli (если
+установлен модуль brotli) по заголовку Accept-Encoding. Сжатые варианты
+создаются один раз для версии файла и хранятся в кэше вместе с исходным телом.
+
+Запросы с заголовком Range (и If-Range) получают 206 Partial Content с одним
+диапазоном или multipart/byteranges с несколькими. Диапазоны больших файлов
+передаются из отображенного в память файла (mmap) без чтения файла целиком.
+
+Запросы разбираются инкрементально общим модулем http_parser.py: заголовки,
+пришедшие несколькими сегментами, дочитываются без повторного разбора, тело
+читается по Content-Length или Transfer-Encoding: chunked.
+
+Режимы работы (--mode):
+threads   - каждое соединение обслуживается в своем потоке (по умолчанию)
+selectors - один поток и цикл событий на selectors (epoll/kqueue): сокеты
+            неблокирующие, у каждого соединения свое состояние - чтение
+            запроса, обработка, запись ответа; ответ, не принятый сокетом
+            целиком, дописывается по готовности сокета к записи
+
+С --workers N главный процесс запускает N процессов-обработчиков, каждый со
+своим слушающим сокетом на общем порту (SO_REUSEPORT), перезапускает
+упавшие обработчики и передает им сигналы: SIGINT/SIGTERM - плавная
+остановка, SIGHUP - плавная замена всех обработчиков новыми.
+
+Каждый запрос записывается в журнал доступа (access_log.py, формат combined
+или json): запись только ставится в очередь, а выводит ее пачками фоновый
+поток, поэтому вывод не задерживает ответы. Журнал подключений выводится
+только с --verbose.
 """
 
+import argparse
+import collections
+import email.utils
+import gzip
+import mmap
+import secrets
+import selectors
+import signal
 import socket
 import sys
 import os
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
+
+# Общие модули лабораторной (http_parser.py) лежат в каталоге lab1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from access_log import FORMATS as ACCESS_LOG_FORMATS, AccessLog
+from http_parser import HttpError, HttpParser
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Постоянные соединения (задаются параметрами в main)
+KEEP_ALIVE_TIMEOUT = 5.0
+MAX_REQUESTS_PER_CONNECTION = 100
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+
+# Значение Cache-Control для файлов: no-cache - браузер каждый раз проверяет
+# актуальность условным запросом и получает 304, если файл не менялся
+CACHE_CONTROL = 'no-cache'
+
+# Сжатие: кодирование -> функция; порядок задает предпочтение при равных q
+COMPRESSORS = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+if brotli is not None:
+    COMPRESSORS = {'br': lambda data: brotli.compress(data, quality=11), **COMPRESSORS}
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 256
+
+# Больше диапазонов в одном запросе не обслуживаем (отдаем файл целиком)
+MAX_RANGES = 16
+
+# Режим selectors: как часто закрывать простаивающие соединения и сколько
+# буферов передавать одним вызовом sendmsg
+SWEEP_INTERVAL = 1.0
+MAX_SEND_BUFFERS = 512
+
+# Журнал доступа (создается в main или в процессе-обработчике) и вывод
+# журнала подключений
+access_log = None
+VERBOSE = False
+
+# Плавная остановка процесса-обработчика: новые подключения не принимаются,
+# начатые запросы дообслуживаются не дольше SHUTDOWN_TIMEOUT секунд
+shutdown_requested = threading.Event()
+SHUTDOWN_TIMEOUT = 10.0
+# Обработчик, проработавший меньше этого, перезапускается с такой задержкой
+RESTART_DELAY = 1.0
 
 def get_content_type(file_path):
     """Определяет Content-Type по расширению файла"""
@@ -27,60 +132,443 @@ def get_content_type(file_path):
     else:
         return 'text/plain'
 
+class CacheEntry:
+    """Запись кэша: тело ответа, признаки версии файла и валидаторы для условных запросов"""
+    
+    __slots__ = ('body', 'version', 'checked', 'etag', 'last_modified', 'mtime', 'variants')
+    
+    def __init__(self, body, version, checked):
+        self.body = body
+        self.version = version  # (mtime_ns, size, inode)
+        self.checked = checked
+        self.variants = {}  # кодирование -> сжатое тело или None, если сжатие не выгодно
+        # Валидаторы вычисляются один раз для версии файла
+        mtime_ns, size, inode = version
+        self.etag = f'"{inode:x}-{size:x}-{mtime_ns:x}"'
+        self.mtime = mtime_ns // 1_000_000_000
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+    
+    @property
+    def size(self):
+        """Объем записи в кэше вместе со сжатыми вариантами"""
+        return len(self.body) + sum(len(data) for data in self.variants.values() if data)
+
+# Часть тела ответа, которая передается из файла через sendfile
+FileSlice = collections.namedtuple('FileSlice', ['file', 'offset', 'count'])
+# Часть тела ответа из отображенного в память файла (mmap)
+MappedSlice = collections.namedtuple('MappedSlice', ['mapping', 'offset', 'count'])
+
+def file_version(stat_result):
+    """Признаки, по которым запись кэша сверяется с файлом"""
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino
+
+class FileCache:
+    """Потокобезопасный LRU-кэш тел ответов с ограничением по объему и проверкой актуальности"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024, check_interval=1.0,
+                 max_entry_size=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.max_entry_size = max_entry_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, file_path):
+        """Возвращает CacheEntry (тело - байты или FileSlice для больших файлов); FileNotFoundError, если файла нет"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(file_path)
+        if entry is not None:
+            # Недавно проверенная запись отдается без системных вызовов
+            if now - entry.checked < self.check_interval:
+                return self.hit(file_path, entry)
+            try:
+                version = file_version(os.stat(file_path))
+            except OSError:
+                self.remove(file_path)
+                raise
+            if version == entry.version:
+                entry.checked = now
+                return self.hit(file_path, entry)
+            self.remove(file_path)
+        
+        with self.lock:
+            self.misses += 1
+        # Файл читается без блокировки: другие потоки в это время обслуживаются из кэша
+        file = open(file_path, 'rb')
+        try:
+            # Версия берется у открытого файла: он не мог смениться между stat и чтением
+            stat_result = os.fstat(file.fileno())
+            if stat_result.st_size > self.max_entry_size:
+                # Большой файл не читается в память: вызывающий закроет его после отправки
+                return CacheEntry(FileSlice(file, 0, stat_result.st_size),
+                                  file_version(stat_result), now)
+            body = file.read()
+        except BaseException:
+            file.close()
+            raise
+        file.close()
+        entry = CacheEntry(body, file_version(stat_result), now)
+        self.put(file_path, entry)
+        return entry
+    
+    def hit(self, file_path, entry):
+        with self.lock:
+            if file_path in self.entries:
+                self.entries.move_to_end(file_path)
+            self.hits += 1
+        return entry
+    
+    def put(self, file_path, entry):
+        """Сохраняет запись, вытесняя самые давние, пока не уложимся в объем"""
+        if len(entry.body) > self.max_bytes:
+            return
+        with self.lock:
+            self.remove_locked(file_path)
+            self.entries[file_path] = entry
+            self.size += entry.size
+            self.evict_locked()
+    
+    def variant(self, file_path, entry, encoding):
+        """Возвращает тело, сжатое кодированием encoding, или None, если сжатие не выгодно"""
+        if encoding in entry.variants:
+            return entry.variants[encoding]
+        # Сжатый вариант хранится только при записи в кэше: иначе (кэш нулевого
+        # объема, тело больше объема) сжатие повторялось бы на каждый запрос
+        with self.lock:
+            if self.entries.get(file_path) is not entry:
+                return None
+        # Сжатие выполняется один раз для версии файла, без блокировки кэша
+        data = COMPRESSORS[encoding](entry.body)
+        if len(data) >= len(entry.body):
+            data = None
+        with self.lock:
+            if encoding not in entry.variants:
+                # Вариант, который не умещается в кэш вместе с записью, вытеснил
+                # бы ее саму; тогда следующие ответы отдаются без сжатия
+                stored = data if data and entry.size + len(data) <= self.max_bytes else None
+                entry.variants[encoding] = stored
+                if self.entries.get(file_path) is entry and stored:
+                    self.size += len(stored)
+                    self.evict_locked()
+        return data
+    
+    def evict_locked(self):
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+    
+    def remove(self, file_path):
+        with self.lock:
+            self.remove_locked(file_path)
+    
+    def remove_locked(self, file_path):
+        entry = self.entries.pop(file_path, None)
+        if entry is not None:
+            self.size -= entry.size
+    
+    def stats(self):
+        """Возвращает словарь со статистикой кэша"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+file_cache = FileCache()
+
 def read_file(file_path):
-    """Читает содержимое файла"""
+    """Возвращает CacheEntry с содержимым файла (из кэша) или None, если файла нет"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    except FileNotFoundError:
+        return file_cache.get(os.path.abspath(file_path))
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         return None
     except Exception as e:
         print(f"Ошибка чтения файла {file_path}: {e}")
         return None
 
-def create_http_response(status_code, content_type, content, additional_headers=None):
-    """Создает HTTP-ответ"""
+def select_encoding(accept_encoding):
+    """Выбирает лучшее из поддерживаемых сжатий по Accept-Encoding или None"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name] = quality
+    
+    best, best_quality = None, 0.0
+    for encoding in COMPRESSORS:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def create_http_response(status_code, content_type, content, additional_headers=None,
+                         keep_alive=False):
+    """Создает HTTP-ответ - список частей для send_response
+
+    content - строка, готовые байты, FileSlice или список частей (байты,
+    memoryview, FileSlice, MappedSlice); части из файлов не копируются, а
+    передаются после заголовков.
+    """
     status_messages = {
         200: "OK",
+        206: "Partial Content",
+        304: "Not Modified",
+        400: "Bad Request",
         404: "Not Found",
-        500: "Internal Server Error"
+        405: "Method Not Allowed",
+        413: "Payload Too Large",
+        416: "Range Not Satisfiable",
+        431: "Request Header Fields Too Large",
+        500: "Internal Server Error",
+        501: "Not Implemented"
     }
     
     status_line = f"HTTP/1.1 {status_code} {status_messages.get(status_code, 'Unknown')}\r\n"
     
-    headers = [
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    parts = content if isinstance(content, list) else [content]
+    content_length = sum(part_length(part) for part in parts)
+    
+    # Ответ 304 не имеет тела и не описывает его тип и длину
+    headers = [] if status_code == 304 else [
         f"Content-Type: {content_type}\r\n",
-        f"Content-Length: {len(content.encode('utf-8'))}\r\n",
+        f"Content-Length: {content_length}\r\n",
+    ]
+    headers += [
         f"Server: Python-HTTP-Server/1.0\r\n",
-        f"Date: {datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')}\r\n",
-        "Connection: close\r\n"
+        f"Date: {datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')}\r\n",
+        "Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n"
     ]
     
     if additional_headers:
         headers.extend(additional_headers)
     
-    response = status_line + "".join(headers) + "\r\n" + content
-    return response
+    head = (status_line + "".join(headers) + "\r\n").encode('utf-8')
+    if isinstance(content, bytes):
+        return [head + content]
+    return [head, *parts]
+
+def part_length(part):
+    if isinstance(part, (FileSlice, MappedSlice)):
+        return part.count
+    return len(part)
 
-def handle_request(request):
-    """Обрабатывает HTTP-запрос"""
+def send_all(client_socket, data):
+    """Отправляет данные целиком; срок сокета ограничивает каждую запись, а не всю отправку"""
+    # sendall считает срок на весь вызов и оборвал бы медленное, но читающее
+    # скачивание большого диапазона; как и sendfile, ждем только остановившегося клиента
+    with memoryview(data) as view:
+        sent = 0
+        while sent < len(view):
+            sent += client_socket.send(view[sent:])
+
+def send_response(client_socket, response):
+    """Отправляет части ответа; файлы передаются через sendfile и закрываются"""
     try:
-        # Парсим первую строку запроса
-        lines = request.split('\n')
-        if not lines:
-            return create_http_response(400, 'text/plain', 'Bad Request')
+        pending = []
+        for part in response:
+            if isinstance(part, (FileSlice, MappedSlice)):
+                if pending:
+                    send_all(client_socket, b"".join(pending))
+                    pending = []
+                if isinstance(part, FileSlice):
+                    client_socket.sendfile(part.file, part.offset, part.count)
+                else:
+                    # Страницы файла отправляются прямо из отображения, без копии в bytes
+                    with memoryview(part.mapping)[part.offset:part.offset + part.count] as view:
+                        send_all(client_socket, view)
+            else:
+                # Ответы на конвейерные запросы склеиваются в одну отправку
+                pending.append(part)
+        if pending:
+            send_all(client_socket, b"".join(pending))
+    finally:
+        release_parts(response)
+
+def release_parts(parts):
+    """Закрывает файлы и отображения, на которые ссылаются части ответа"""
+    for part in parts:
+        if isinstance(part, FileSlice):
+            part.file.close()
+        elif isinstance(part, MappedSlice):
+            part.mapping.close()
+
+def send_available(client_socket, output):
+    """Неблокирующая отправка частей из очереди output; True - очередь опустела
+
+    Отправляется столько, сколько принимает сокет; недоотправленная часть
+    остается в начале очереди с оставшимся смещением и размером.
+    """
+    while output:
+        part = output[0]
+        try:
+            if isinstance(part, FileSlice):
+                sent = os.sendfile(client_socket.fileno(), part.file.fileno(),
+                                   part.offset, part.count) if part.count else 0
+                if sent == 0 and part.count:
+                    raise OSError(f"файл {part.file.name} укорочен во время отправки")
+            elif isinstance(part, MappedSlice):
+                with memoryview(part.mapping)[part.offset:part.offset + part.count] as view:
+                    sent = client_socket.send(view)
+            else:
+                # Подряд идущие байтовые части уходят одним sendmsg без склейки
+                buffers = []
+                for buffer in output:
+                    if isinstance(buffer, (FileSlice, MappedSlice)) or len(buffers) == MAX_SEND_BUFFERS:
+                        break
+                    buffers.append(buffer)
+                sent = client_socket.sendmsg(buffers)
+                for buffer in buffers:
+                    if sent < len(buffer):
+                        output[0] = memoryview(buffer)[sent:]
+                        break
+                    sent -= len(buffer)
+                    output.popleft()
+                continue
+        except (BlockingIOError, InterruptedError):
+            return False
         
-        request_line = lines[0].strip()
-        parts = request_line.split()
+        if sent < part.count:
+            output[0] = part._replace(offset=part.offset + sent, count=part.count - sent)
+            continue
+        output.popleft()
+        # Диапазоны multipart ссылаются на одно отображение - оно закрывается
+        # после отправки последнего из них
+        if not any(isinstance(other, type(part)) and other[0] is part[0] for other in output):
+            release_parts([part])
+    return True
+
+def is_not_modified(headers, entry, etag):
+    """Проверяет условия If-None-Match / If-Modified-Since для версии файла"""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        # If-None-Match важнее If-Modified-Since; для GET допустимо слабое сравнение
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or etag in tags
+    
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return entry.mtime <= since.timestamp()
+    return False
+
+def parse_ranges(range_header, size):
+    """Разбирает Range: bytes=...; возвращает [(начало, конец)] включительно или None
+
+    None - заголовок некорректен или не поддерживается (отдается весь файл),
+    пустой список - ни один диапазон не пересекается с файлом (416).
+    """
+    unit, _, spec = range_header.partition('=')
+    items = spec.split(',')
+    if unit.strip().lower() != 'bytes' or len(items) > MAX_RANGES:
+        return None
+    
+    ranges = []
+    for item in items:
+        start, dash, end = item.strip().partition('-')
+        if (not dash or not (start or end) or (start and not start.isdigit())
+                or (end and not end.isdigit())):
+            return None
+        if not start:
+            # bytes=-N - последние N байт
+            length = int(end)
+            if length > 0 and size > 0:
+                ranges.append((max(size - length, 0), size - 1))
+            continue
+        first = int(start)
+        if end and int(end) < first:
+            return None
+        last = int(end) if end else size - 1
+        if first < size:
+            ranges.append((first, min(last, size - 1)))
+    return ranges
+
+def if_range_matches(if_range, entry):
+    """Проверяет If-Range: диапазон отдается, только если файл не изменился"""
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Для If-Range допустимо только строгое сравнение тегов
+        return if_range == entry.etag
+    return if_range == entry.last_modified
+
+def create_range_response(content_type, body, size, ranges, extra_headers, keep_alive):
+    """Создает ответ 206 с одним или несколькими диапазонами или 416"""
+    if not ranges:
+        if isinstance(body, FileSlice):
+            body.file.close()
+        return create_http_response(416, 'text/plain', 'Range Not Satisfiable',
+                                    extra_headers + [f"Content-Range: bytes */{size}\r\n"],
+                                    keep_alive=keep_alive)
+    
+    if isinstance(body, FileSlice):
+        # Большой файл отображается в память: в ответ попадают только нужные страницы
+        with body.file:
+            mapping = mmap.mmap(body.file.fileno(), 0, access=mmap.ACCESS_READ)
         
-        if len(parts) < 3:
-            return create_http_response(400, 'text/plain', 'Bad Request')
+        def make_slice(first, last):
+            return MappedSlice(mapping, first, last - first + 1)
+    else:
+        view = memoryview(body)
         
-        method, path, version = parts[0], parts[1], parts[2]
+        def make_slice(first, last):
+            return view[first:last + 1]
+    
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        return create_http_response(206, content_type, [make_slice(first, last)],
+                                    extra_headers + [f"Content-Range: bytes {first}-{last}/{size}\r\n"],
+                                    keep_alive=keep_alive)
+    
+    boundary = secrets.token_hex(16)
+    parts = []
+    for first, last in ranges:
+        parts.append((f"\r\n--{boundary}\r\n"
+                      f"Content-Type: {content_type}\r\n"
+                      f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n").encode('utf-8'))
+        parts.append(make_slice(first, last))
+    parts.append(f"\r\n--{boundary}--\r\n".encode('utf-8'))
+    return create_http_response(206, f"multipart/byteranges; boundary={boundary}", parts,
+                                extra_headers, keep_alive=keep_alive)
+
+def handle_request(request, keep_alive=False):
+    """Обрабатывает разобранный запрос HttpRequest; keep_alive - оставить ли соединение открытым"""
+    try:
+        method, path, headers = request.method, request.path, request.headers
         
         # Проверяем метод
         if method != 'GET':
-            return create_http_response(405, 'text/plain', 'Method Not Allowed')
+            return create_http_response(405, 'text/plain', 'Method Not Allowed',
+                                        keep_alive=keep_alive)
         
         # Обрабатываем путь
         if path == '/' or path == '/index.html':
@@ -90,9 +578,9 @@ def handle_request(request):
             file_path = path.lstrip('/')
         
         # Читаем файл
-        content = read_file(file_path)
+        entry = read_file(file_path)
         
-        if content is None:
+        if entry is None:
             # Файл не найден
             error_content = """
             <!DOCTYPE html>
@@ -111,13 +599,48 @@ def handle_request(request):
             </body>
             </html>
             """
-            return create_http_response(404, 'text/html; charset=utf-8', error_content)
+            return create_http_response(404, 'text/html; charset=utf-8', error_content,
+                                        keep_alive=keep_alive)
         
         # Определяем Content-Type
         content_type = get_content_type(file_path)
+        body, etag = entry.body, entry.etag
+        extra_headers = ["Accept-Ranges: bytes\r\n"]
+        
+        # Диапазоны отдаются из несжатого файла, если он не изменился (If-Range)
+        ranges = None
+        if 'range' in headers and if_range_matches(headers.get('if-range'), entry):
+            ranges = parse_ranges(headers['range'], entry.version[1])
+        
+        # Сжатый вариант выбирается по Accept-Encoding; у каждого варианта свой ETag
+        if is_compressible(content_type) and not isinstance(body, FileSlice):
+            extra_headers.append("Vary: Accept-Encoding\r\n")
+            encoding = select_encoding(headers.get('accept-encoding', ''))
+            if encoding and ranges is None and len(body) >= MIN_COMPRESS_SIZE:
+                compressed = file_cache.variant(os.path.abspath(file_path), entry, encoding)
+                if compressed is not None:
+                    body, etag = compressed, f'{etag[:-1]}-{encoding}"'
+                    extra_headers.append(f"Content-Encoding: {encoding}\r\n")
+        
+        extra_headers += [
+            f"ETag: {etag}\r\n",
+            f"Last-Modified: {entry.last_modified}\r\n",
+            f"Cache-Control: {CACHE_CONTROL}\r\n",
+        ]
+        
+        # Файл у клиента не устарел - отвечаем 304 без тела
+        if is_not_modified(headers, entry, etag):
+            if isinstance(body, FileSlice):
+                body.file.close()
+            return create_http_response(304, content_type, b"", extra_headers, keep_alive=keep_alive)
+        
+        if ranges is not None:
+            return create_range_response(content_type, body, entry.version[1], ranges,
+                                         extra_headers, keep_alive)
         
         # Создаем успешный ответ
-        return create_http_response(200, content_type, content)
+        return create_http_response(200, content_type, body, extra_headers,
+                                    keep_alive=keep_alive)
         
     except Exception as e:
         print(f"Ошибка обработки запроса: {e}")
@@ -137,57 +660,510 @@ def handle_request(request):
         </body>
         </html>
         """
-        return create_http_response(500, 'text/html; charset=utf-8', error_content)
+        return create_http_response(500, 'text/html; charset=utf-8', error_content,
+                                    keep_alive=keep_alive)
 
-def main():
-    # Создаем TCP сокет
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+def log_access(client_address, request, response, started):
+    """Ставит запись о запросе в журнал доступа; request None - запрос не разобран"""
+    if access_log is None:
+        return
+    # Первая часть ответа всегда начинается со строки статуса и заголовков
+    head = response[0]
+    size = sum(part_length(part) for part in response) - head.find(b"\r\n\r\n") - 4
+    if request is None:
+        access_log.log(client_address[0], '-', int(head[9:12]), size,
+                       duration=time.monotonic() - started)
+        return
+    access_log.log(client_address[0], request.request_line, int(head[9:12]), size,
+                   request.headers.get('referer', '-'), request.headers.get('user-agent', '-'),
+                   time.monotonic() - started)
+
+def handle_connection(client_socket, client_address):
+    """Обслуживает постоянное соединение: запросы по очереди читаются из буфера"""
+    parser = HttpParser(MAX_HEADER_SIZE, MAX_BODY_SIZE)
+    handled = 0
+    client_socket.settimeout(KEEP_ALIVE_TIMEOUT or None)
+    try:
+        while True:
+            # Все полные запросы из буфера (конвейер) обрабатываются по порядку,
+            # а ответы отправляются вместе
+            response = []
+            keep_alive = True
+            try:
+                while keep_alive:
+                    request = parser.next_request()
+                    if request is None:
+                        break
+                    handled += 1
+                    keep_alive = (request.keep_alive and handled < MAX_REQUESTS_PER_CONNECTION
+                                  and not shutdown_requested.is_set())
+                    started = time.monotonic()
+                    request_response = handle_request(request, keep_alive)
+                    log_access(client_address, request, request_response, started)
+                    response += request_response
+            except HttpError as e:
+                # Ответы на предыдущие запросы уходят первыми, затем ошибка
+                error_response = create_http_response(e.status, 'text/plain', e.message)
+                log_access(client_address, None, error_response, time.monotonic())
+                response += error_response
+                keep_alive = False
+            if response:
+                send_response(client_socket, response)
+            if not keep_alive:
+                return
+            
+            try:
+                chunk = client_socket.recv(65536)
+            except socket.timeout:
+                return
+            if not chunk:
+                return
+            parser.feed(chunk)
     
-    # Настройки сервера
-    host = 'localhost'
-    port = 8080
+    except Exception as e:
+        print(f"Ошибка обработки клиента {client_address}: {e}")
+    
+    finally:
+        # Закрываем соединение с клиентом
+        client_socket.close()
+        if VERBOSE:
+            print(f"Соединение с {client_address} закрыто (запросов: {handled})")
+
+class Connection:
+    """Соединение в режиме selectors и его состояние
+
+    reading - ждем данные запроса, writing - отправляем ответы из output;
+    после отправки соединение возвращается к чтению или закрывается.
+    """
+    
+    __slots__ = ('socket', 'address', 'parser', 'output', 'state', 'keep_alive',
+                 'handled', 'last_active')
+    
+    def __init__(self, client_socket, client_address):
+        self.socket = client_socket
+        self.address = client_address
+        self.parser = HttpParser(MAX_HEADER_SIZE, MAX_BODY_SIZE)
+        self.output = collections.deque()
+        self.state = 'reading'
+        self.keep_alive = True
+        self.handled = 0
+        self.last_active = time.monotonic()
+
+class SelectorServer:
+    """Однопоточный HTTP-сервер на цикле событий selectors"""
+    
+    def __init__(self, server_socket):
+        self.server_socket = server_socket
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.accepting = True
+        self.drain_deadline = None
+    
+    def serve_forever(self):
+        """Цикл событий: прием подключений, чтение запросов и запись ответов"""
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        next_sweep = time.monotonic() + SWEEP_INTERVAL
+        try:
+            while True:
+                for key, events in self.selector.select(timeout=SWEEP_INTERVAL):
+                    connection = key.data
+                    if connection is None:
+                        self.accept()
+                        continue
+                    try:
+                        if connection.state == 'reading':
+                            self.on_readable(connection)
+                        else:
+                            self.on_writable(connection)
+                    except Exception as e:
+                        print(f"Ошибка обработки клиента {connection.address}: {e}")
+                        if connection in self.connections:
+                            self.close(connection)
+                
+                now = time.monotonic()
+                if shutdown_requested.is_set() and self.drain(now):
+                    break
+                if now >= next_sweep:
+                    self.sweep(now)
+                    next_sweep = now + SWEEP_INTERVAL
+        finally:
+            for connection in list(self.connections):
+                self.close(connection)
+            self.selector.close()
+    
+    def accept(self):
+        """Принимает все ожидающие подключения"""
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # Например, закончились дескрипторы: прием продолжится после
+                # очередной проверки соединений, а не в каждом проходе цикла
+                print(f"Ошибка приема подключения: {e}")
+                self.selector.unregister(self.server_socket)
+                self.accepting = False
+                return
+            if VERBOSE:
+                print(f"Подключение от: {client_address}")
+            client_socket.setblocking(False)
+            connection = Connection(client_socket, client_address)
+            self.connections.add(connection)
+            self.selector.register(client_socket, selectors.EVENT_READ, connection)
+    
+    def on_readable(self, connection):
+        try:
+            chunk = connection.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self.close(connection)
+            return
+        connection.last_active = time.monotonic()
+        connection.parser.feed(chunk)
+        self.process(connection)
     
+    def process(self, connection):
+        """Обрабатывает полные запросы из буфера и начинает отправку ответов"""
+        try:
+            while connection.keep_alive:
+                request = connection.parser.next_request()
+                if request is None:
+                    break
+                connection.handled += 1
+                connection.keep_alive = (request.keep_alive and
+                                         connection.handled < MAX_REQUESTS_PER_CONNECTION and
+                                         not shutdown_requested.is_set())
+                started = time.monotonic()
+                response = handle_request(request, connection.keep_alive)
+                log_access(connection.address, request, response, started)
+                connection.output.extend(response)
+        except HttpError as e:
+            # Ответы на предыдущие запросы уходят первыми, затем ошибка
+            response = create_http_response(e.status, 'text/plain', e.message)
+            log_access(connection.address, None, response, time.monotonic())
+            connection.output.extend(response)
+            connection.keep_alive = False
+        if connection.output:
+            self.on_writable(connection)
+    
+    def on_writable(self, connection):
+        try:
+            complete = send_available(connection.socket, connection.output)
+        except OSError:
+            self.close(connection)
+            return
+        connection.last_active = time.monotonic()
+        
+        if not complete:
+            # Сокет принял не все - ждем готовности к записи, новые запросы
+            # конвейера пока остаются в буфере
+            self.set_state(connection, 'writing')
+        elif not connection.keep_alive:
+            self.close(connection)
+        else:
+            self.set_state(connection, 'reading')
+    
+    def set_state(self, connection, state):
+        if connection.state == state:
+            return
+        events = selectors.EVENT_WRITE if state == 'writing' else selectors.EVENT_READ
+        self.selector.modify(connection.socket, events, connection)
+        connection.state = state
+    
+    def sweep(self, now):
+        """Закрывает соединения без активности дольше --keep-alive-timeout"""
+        if KEEP_ALIVE_TIMEOUT:
+            for connection in [connection for connection in self.connections
+                               if now - connection.last_active > KEEP_ALIVE_TIMEOUT]:
+                self.close(connection)
+        if not self.accepting and self.drain_deadline is None:
+            self.selector.register(self.server_socket, selectors.EVENT_READ)
+            self.accepting = True
+    
+    def drain(self, now):
+        """Плавная остановка; True - все соединения закрыты или срок вышел"""
+        if self.drain_deadline is None:
+            if self.accepting:
+                self.selector.unregister(self.server_socket)
+                self.accepting = False
+            self.drain_deadline = now + SHUTDOWN_TIMEOUT
+        # Соединения без начатого запроса больше не нужны; остальные
+        # закрываются сами после ответа (keep-alive уже выключен)
+        for connection in [connection for connection in self.connections
+                           if connection.state == 'reading' and connection.parser.idle]:
+            self.close(connection)
+        return not self.connections or now >= self.drain_deadline
+    
+    def close(self, connection):
+        self.connections.discard(connection)
+        self.selector.unregister(connection.socket)
+        connection.socket.close()
+        release_parts(connection.output)
+        connection.output.clear()
+        if VERBOSE:
+            print(f"Соединение с {connection.address} закрыто (запросов: {connection.handled})")
+
+def serve_threads(server_socket):
+    """Принимает подключения и обслуживает каждое в отдельном потоке"""
+    # Ожидание подключения прерывается, чтобы заметить запрос остановки
+    server_socket.settimeout(SWEEP_INTERVAL)
+    threads = []
+    while not shutdown_requested.is_set():
+        # Принимаем подключение
+        try:
+            client_socket, client_address = server_socket.accept()
+        except socket.timeout:
+            continue
+        if VERBOSE:
+            print(f"Подключение от: {client_address}")
+        
+        # Постоянное соединение обслуживается в своем потоке, чтобы
+        # простаивающий клиент не задерживал остальных
+        thread = threading.Thread(target=handle_connection, args=(client_socket, client_address),
+                                  daemon=True)
+        thread.start()
+        threads = [thread for thread in threads if thread.is_alive()] + [thread]
+    
+    # Плавная остановка: ждем завершения начатых соединений
+    server_socket.close()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+def create_server_socket(host, port, backlog, reuse_port=False):
+    """Создает слушающий сокет; reuse_port - порт общий для нескольких процессов"""
+    # Создаем TCP сокет
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         # Позволяем переиспользовать адрес
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Ядро распределяет новые подключения между сокетами всех процессов
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         
         # Привязываем сокет к адресу и порту
         server_socket.bind((host, port))
-        server_socket.listen(5)
+        server_socket.listen(backlog)
+    except OSError:
+        server_socket.close()
+        raise
+    return server_socket
+
+def serve(server_socket, mode):
+    """Обслуживает подключения к server_socket в выбранном режиме"""
+    if mode == 'selectors':
+        SelectorServer(server_socket).serve_forever()
+    else:
+        serve_threads(server_socket)
+
+def open_access_log(args):
+    """Запускает журнал доступа по параметрам командной строки"""
+    global access_log
+    if args.access_log != 'off':
+        access_log = AccessLog(args.access_log, args.access_log_format,
+                               max_bytes=args.access_log_max_bytes,
+                               backup_count=args.access_log_backups)
+
+def close_access_log():
+    """Дописывает журнал доступа и выводит его статистику"""
+    if access_log is not None:
+        access_log.close()
+        print(f"Журнал доступа: {access_log.stats()}")
+
+def run_worker(args):
+    """Точка входа процесса-обработчика; не возвращается"""
+    # Сигналы остановки означают плавное завершение; SIGHUP обрабатывает
+    # только главный процесс
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: shutdown_requested.set())
+    
+    exit_code = 0
+    open_access_log(args)
+    try:
+        server_socket = create_server_socket(args.host, args.port, args.backlog, reuse_port=True)
+        print(f"Обработчик {os.getpid()} запущен")
+        try:
+            serve(server_socket, args.mode)
+        finally:
+            server_socket.close()
+    except Exception as e:
+        print(f"Ошибка обработчика {os.getpid()}: {e}")
+        exit_code = 1
+    close_access_log()
+    print(f"Обработчик {os.getpid()} завершил работу, кэш файлов: {file_cache.stats()}")
+    sys.stdout.flush()
+    os._exit(exit_code)
+
+def run_workers(args):
+    """Главный процесс: держит args.workers обработчиков на общем порту"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        print("Ошибка: SO_REUSEPORT не поддерживается на этой платформе")
+        sys.exit(1)
+    
+    # Адрес проверяется заранее (порт занят сервером без SO_REUSEPORT, нет
+    # прав и т.п.): обработчик, который не может его занять, перезапускался бы
+    # бесконечно
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        probe.bind((args.host, args.port))
+    
+    workers = {}  # pid -> время запуска текущего поколения обработчиков
+    stopping = False
+    
+    def spawn():
+        # Буфер вывода сбрасывается, иначе его копия напечаталась бы и в обработчике
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            run_worker(args)
+        workers[pid] = time.monotonic()
+    
+    def terminate(pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def on_stop(signum, frame):
+        # Передаем сигнал остановки всем процессам-обработчикам
+        nonlocal stopping
+        stopping = True
+        terminate(list(workers))
+    
+    def on_reload(signum, frame):
+        # Новые обработчики начинают принимать подключения раньше, чем старые
+        # перестают, поэтому порт не остается без слушающего сокета
+        if stopping:
+            return
+        old = list(workers)
+        workers.clear()
+        for _ in range(args.workers):
+            spawn()
+        print(f"Перезагрузка: новые обработчики {list(workers)}, завершаются {old}")
+        terminate(old)
+    
+    for _ in range(args.workers):
+        spawn()
+    print(f"Запущено {args.workers} процессов: {list(workers)}")
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGHUP, on_reload)
+    
+    while True:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            # Обработчик прежнего поколения или остановка сервера
+            continue
+        print(f"Обработчик {pid} завершился (код {os.waitstatus_to_exitcode(status)}), перезапуск")
+        if time.monotonic() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        if not stopping:
+            spawn()
+
+def raise_open_files_limit():
+    """Поднимает мягкий лимит открытых файлов до жесткого; возвращает новый лимит"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return soft
+
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="HTTP Server")
+    parser.add_argument('--mode', choices=['threads', 'selectors'], default='threads',
+                        help="модель обработки подключений")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--backlog', type=int, default=128,
+                        help="длина очереди ожидающих подключений (listen)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число процессов-обработчиков на общем порту (SO_REUSEPORT)")
+    parser.add_argument('--shutdown-timeout', type=float, default=10.0,
+                        help="сколько секунд дообслуживать соединения при остановке обработчика")
+    parser.add_argument('--access-log', default='-',
+                        help="файл журнала доступа ('-' - stdout, 'off' - выключен)")
+    parser.add_argument('--access-log-format', choices=ACCESS_LOG_FORMATS, default='combined',
+                        help="формат журнала доступа")
+    parser.add_argument('--access-log-max-bytes', type=int, default=10 * 1024 * 1024,
+                        help="размер файла журнала, после которого он ротируется (0 - без ротации)")
+    parser.add_argument('--access-log-backups', type=int, default=5,
+                        help="сколько архивных файлов журнала хранить")
+    parser.add_argument('--verbose', action='store_true',
+                        help="выводить журнал подключений")
+    parser.add_argument('--cache-size', type=int, default=64 * 1024 * 1024,
+                        help="объем кэша файлов в байтах (0 - без кэша)")
+    parser.add_argument('--cache-check-interval', type=float, default=1.0,
+                        help="как часто сверять запись кэша с файлом, в секундах")
+    parser.add_argument('--max-age', type=int, default=0,
+                        help="сколько секунд браузер может не проверять файл (0 - проверять всегда)")
+    parser.add_argument('--keep-alive-timeout', type=float, default=5.0,
+                        help="сколько секунд держать простаивающее соединение (0 - без срока)")
+    parser.add_argument('--max-requests', type=int, default=100,
+                        help="максимум запросов в одном соединении")
+    parser.add_argument('--sendfile-threshold', type=int, default=1024 * 1024,
+                        help="файлы больше этого размера (байт) передаются через sendfile без кэша")
+    return parser.parse_args()
+
+def main():
+    global KEEP_ALIVE_TIMEOUT, MAX_REQUESTS_PER_CONNECTION, CACHE_CONTROL, SHUTDOWN_TIMEOUT, VERBOSE
+    args = parse_args()
+    VERBOSE = args.verbose
+    SHUTDOWN_TIMEOUT = args.shutdown_timeout
+    CACHE_CONTROL = f"public, max-age={args.max_age}" if args.max_age > 0 else 'no-cache'
+    KEEP_ALIVE_TIMEOUT = args.keep_alive_timeout
+    MAX_REQUESTS_PER_CONNECTION = args.max_requests
+    file_cache.max_bytes = args.cache_size
+    file_cache.check_interval = args.cache_check_interval
+    file_cache.max_entry_size = args.sendfile_threshold
+    
+    # Настройки сервера
+    host = args.host
+    port = args.port
+    server_socket = None
+    
+    try:
+        if args.mode == 'selectors':
+            # Каждое соединение - открытый дескриптор; тысячам соединений
+            # стандартного лимита 1024 не хватит
+            print(f"Лимит открытых файлов: {raise_open_files_limit()}")
+        
+        if args.workers > 1:
+            print(f"HTTP Server запущен на http://{host}:{port} "
+                  f"(режим {args.mode}, процессов: {args.workers})")
+            print("Нажмите Ctrl+C для остановки сервера, SIGHUP - перезапуск обработчиков")
+            print("-" * 50)
+            run_workers(args)
+            return
+        
+        server_socket = create_server_socket(host, port, args.backlog)
+        open_access_log(args)
         
-        print(f"HTTP Server запущен на http://{host}:{port}")
+        print(f"HTTP Server запущен на http://{host}:{port} (режим {args.mode})")
         print("Сервер готов к обработке запросов...")
         print("Нажмите Ctrl+C для остановки сервера")
         print("-" * 50)
         
-        while True:
-            # Принимаем подключение
-            client_socket, client_address = server_socket.accept()
-            print(f"Подключение от: {client_address}")
-            
-            try:
-                # Получаем запрос от клиента
-                request = client_socket.recv(1024).decode('utf-8')
-                
-                if request:
-                    first_line = request.split('\n')[0]
-                    print(f"Запрос: {first_line}")
-                    
-                    # Обрабатываем запрос
-                    response = handle_request(request)
-                    
-                    # Отправляем ответ клиенту
-                    client_socket.send(response.encode('utf-8'))
-                    print(f"Ответ отправлен клиенту {client_address}")
-                
-            except Exception as e:
-                print(f"Ошибка обработки клиента {client_address}: {e}")
-            
-            finally:
-                # Закрываем соединение с клиентом
-                client_socket.close()
-                print(f"Соединение с {client_address} закрыто")
-                print("-" * 30)
+        serve(server_socket, args.mode)
     
     except KeyboardInterrupt:
         print("\nСервер остановлен пользователем")
@@ -197,7 +1173,10 @@ def main():
     
     finally:
         # Закрываем серверный сокет
-        server_socket.close()
+        if server_socket is not None:
+            server_socket.close()
+            close_access_log()
+            print(f"Кэш файлов: {file_cache.stats()}")
         print("Сервер завершил работу")
 
 if __name__ == "__main__":
@@ -4,14 +4,30 @@ Web Server для задания 5
 Веб-сервер для обработки GET и POST HTTP-запросов
 Принимает и записывает информацию о дисциплине и оценке
 Отдает информацию обо всех оценках в виде HTML-страницы
+
+Запрос читается из сокета по частям и разбирается общим модулем
+http_parser.py, поэтому тело POST-запроса получается целиком, даже если оно
+пришло несколькими сегментами или кусками Transfer-Encoding: chunked.
+
+Запросы записываются в журнал доступа (access_log.py) в формате combined:
+запись ставится в очередь, а выводит ее фоновый поток.
 """
 
 import socket
 import sys
 import os
+import time
 import urllib.parse
 from datetime import datetime
 
+# Общие модули лабораторной (http_parser.py) лежат в каталоге lab1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from access_log import AccessLog
+from http_parser import HttpError, HttpParser
+
+# Срок получения запроса целиком и отправки ответа, в секундах
+REQUEST_TIMEOUT = 10.0
+
 class GradeManager:
     """Класс для управления оценками"""
     
@@ -65,11 +81,14 @@ class GradeManager:
 class WebServer:
     """Веб-сервер для обработки GET и POST запросов"""
     
-    def __init__(self, host='localhost', port=8081):
+    def __init__(self, host='localhost', port=8081, access_log=None,
+                 request_timeout=REQUEST_TIMEOUT):
         self.host = host
         self.port = port
+        self.request_timeout = request_timeout
         self.grade_manager = GradeManager()
         self.server_socket = None
+        self.access_log = access_log
     
     def start(self):
         """Запускает веб-сервер"""
@@ -89,13 +108,12 @@ class WebServer:
             while True:
                 try:
                     client_socket, client_address = self.server_socket.accept()
-                    print(f"📱 Подключение от {client_address}")
-                    
-                    # Обрабатываем запрос
-                    self.handle_request(client_socket, client_address)
-                    
                 except socket.error:
                     break
+                
+                # Обрабатываем запрос; ошибка сокета клиента не останавливает сервер
+                try:
+                    self.handle_request(client_socket, client_address)
                 except Exception as e:
                     print(f"Ошибка обработки подключения: {e}")
         
@@ -110,54 +128,92 @@ class WebServer:
         """Останавливает сервер"""
         if self.server_socket:
             self.server_socket.close()
+        if self.access_log is not None:
+            self.access_log.close()
+            print(f"📋 Журнал доступа: {self.access_log.stats()}")
+            self.access_log = None
         print("🛑 Сервер завершил работу")
     
     def handle_request(self, client_socket, client_address):
         """Обрабатывает HTTP-запрос"""
+        started = time.monotonic()
+        request = None
+        result = None  # (код ответа, размер тела) для журнала доступа
         try:
-            # Получаем запрос
-            request = client_socket.recv(4096).decode('utf-8')
-            if not request:
-                return
-            
-            # Парсим запрос
-            lines = request.split('\n')
-            if not lines:
+            # Получаем и парсим запрос
+            try:
+                request = self.read_request(client_socket)
+            except HttpError as e:
+                result = self.send_error_response(client_socket, e.status, e.message)
                 return
-            
-            request_line = lines[0].strip()
-            parts = request_line.split()
-            
-            if len(parts) < 3:
-                self.send_error_response(client_socket, 400, "Bad Request")
+            if request is None:
                 return
             
-            method, path, version = parts[0], parts[1], parts[2]
-            
-            print(f"📝 {method} {path} от {client_address}")
+            method, path = request.method, request.path
             
             # Обрабатываем запрос в зависимости от метода
             if method == 'GET':
-                self.handle_get(client_socket, path)
+                result = self.handle_get(client_socket, path)
             elif method == 'POST':
-                self.handle_post(client_socket, path, request)
+                result = self.handle_post(client_socket, path, request)
             else:
-                self.send_error_response(client_socket, 405, "Method Not Allowed")
+                result = self.send_error_response(client_socket, 405, "Method Not Allowed")
         
         except Exception as e:
             print(f"Ошибка обработки запроса: {e}")
-            self.send_error_response(client_socket, 500, "Internal Server Error")
+            result = self.send_error_response(client_socket, 500, "Internal Server Error")
         finally:
             client_socket.close()
+            if result is not None:
+                self.log_access(client_address, request, result, started)
+    
+    def log_access(self, client_address, request, result, started):
+        """Ставит запись о запросе в журнал доступа"""
+        if self.access_log is None:
+            return
+        status, size = result
+        if request is None:
+            self.access_log.log(client_address[0], '-', status, size,
+                                duration=time.monotonic() - started)
+            return
+        self.access_log.log(client_address[0], request.request_line, status, size,
+                            request.headers.get('referer', '-'),
+                            request.headers.get('user-agent', '-'),
+                            time.monotonic() - started)
+    
+    def read_request(self, client_socket):
+        """Читает из сокета один полный запрос; None - клиент закрыл соединение раньше"""
+        # Клиенты обслуживаются по очереди: срок на весь запрос не дает молчащему
+        # или медленному клиенту задержать остальных, иначе - ответ 408
+        parser = HttpParser()
+        deadline = time.monotonic() + self.request_timeout
+        try:
+            while True:
+                request = parser.next_request()
+                if request is not None:
+                    return request
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HttpError(408, 'Request Timeout')
+                client_socket.settimeout(remaining)
+                try:
+                    chunk = client_socket.recv(65536)
+                except socket.timeout:
+                    raise HttpError(408, 'Request Timeout') from None
+                if not chunk:
+                    return None
+                parser.feed(chunk)
+        finally:
+            # Отправка ответа ограничена тем же сроком
+            client_socket.settimeout(self.request_timeout)
     
     def handle_get(self, client_socket, path):
         """Обрабатывает GET-запросы"""
         if path == '/' or path == '/index.html':
             # Показываем все оценки
             html_content = self.generate_grades_html()
-            self.send_html_response(client_socket, html_content)
-        else:
-            self.send_error_response(client_socket, 404, "Not Found")
+            return self.send_html_response(client_socket, html_content)
+        return self.send_error_response(client_socket, 404, "Not Found")
     
     def handle_post(self, client_socket, path, request):
         """Обрабатывает POST-запросы"""
@@ -173,26 +229,18 @@ class WebServer:
                     print(f"✅ Добавлена оценка: {discipline} - {grade}")
                     
                     # Перенаправляем на главную страницу
-                    self.send_redirect_response(client_socket, "/")
-                else:
-                    self.send_error_response(client_socket, 400, "Bad Request - Missing data")
+                    return self.send_redirect_response(client_socket, "/")
+                return self.send_error_response(client_socket, 400, "Bad Request - Missing data")
             
             except Exception as e:
                 print(f"Ошибка добавления оценки: {e}")
-                self.send_error_response(client_socket, 500, "Internal Server Error")
-        else:
-            self.send_error_response(client_socket, 404, "Not Found")
+                return self.send_error_response(client_socket, 500, "Internal Server Error")
+        return self.send_error_response(client_socket, 404, "Not Found")
     
     def extract_post_body(self, request):
         """Извлекает тело POST-запроса"""
-        try:
-            # Находим пустую строку, которая разделяет заголовки и тело
-            parts = request.split('\r\n\r\n')
-            if len(parts) > 1:
-                return parts[1]
-            return ""
-        except:
-            return ""
+        # Тело уже прочитано парсером ровно по Content-Length или кускам chunked
+        return request.body.decode('utf-8', 'replace')
     
     def parse_form_data(self, body):
         """Парсит данные формы"""
@@ -444,10 +492,11 @@ class WebServer:
         return html
     
     def send_html_response(self, client_socket, html_content):
-        """Отправляет HTML-ответ"""
+        """Отправляет HTML-ответ; возвращает (код ответа, размер тела)"""
+        content_length = len(html_content.encode('utf-8'))
         response = f"""HTTP/1.1 200 OK
 Content-Type: text/html; charset=utf-8
-Content-Length: {len(html_content.encode('utf-8'))}
+Content-Length: {content_length}
 Server: Python-Web-Server/1.0
 Date: {datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')}
 Connection: close
@@ -455,9 +504,10 @@ Connection: close
 {html_content}"""
         
         client_socket.send(response.encode('utf-8'))
+        return 200, content_length
     
     def send_redirect_response(self, client_socket, location):
-        """Отправляет редирект"""
+        """Отправляет редирект; возвращает (код ответа, размер тела)"""
         response = f"""HTTP/1.1 302 Found
 Location: {location}
 Server: Python-Web-Server/1.0
@@ -467,14 +517,19 @@ Connection: close
 """
         
         client_socket.send(response.encode('utf-8'))
+        return 302, 0
     
     def send_error_response(self, client_socket, status_code, message):
-        """Отправляет ответ с ошибкой"""
+        """Отправляет ответ с ошибкой; возвращает (код ответа, размер тела)"""
         status_messages = {
             400: "Bad Request",
             404: "Not Found",
             405: "Method Not Allowed",
-            500: "Internal Server Error"
+            408: "Request Timeout",
+            413: "Payload Too Large",
+            431: "Request Header Fields Too Large",
+            500: "Internal Server Error",
+            501: "Not Implemented"
         }
         
         error_html = f"""
@@ -493,9 +548,10 @@ Connection: close
 </body>
 </html>"""
         
+        content_length = len(error_html.encode('utf-8'))
         response = f"""HTTP/1.1 {status_code} {status_messages.get(status_code, 'Error')}
 Content-Type: text/html; charset=utf-8
-Content-Length: {len(error_html.encode('utf-8'))}
+Content-Length: {content_length}
 Server: Python-Web-Server/1.0
 Date: {datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')}
 Connection: close
@@ -503,9 +559,10 @@ Connection: close
 {error_html}"""
         
         client_socket.send(response.encode('utf-8'))
+        return status_code, content_length
 
 def main():
-    server = WebServer()
+    server = WebServer(access_log=AccessLog())
     
     try:
         server.start()
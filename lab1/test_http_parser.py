@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Модульные тесты инкрементального разбора HTTP-запросов (http_parser.py)
+
+Запуск: python3 -m unittest test_http_parser (из каталога lab1)
+"""
+
+import unittest
+
+from http_parser import HttpError, HttpParser
+
+CHUNKED_HEAD = b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+
+def parse_all(*segments, **limits):
+    """Передает сегменты разборщику по одному; возвращает полученные запросы"""
+    parser = HttpParser(**limits)
+    requests = []
+    for segment in segments:
+        parser.feed(segment)
+        while (request := parser.next_request()) is not None:
+            requests.append(request)
+    return requests
+
+class ChunkSizeTest(unittest.TestCase):
+    """Проверка размеров кусков Transfer-Encoding: chunked"""
+    
+    def assert_status(self, data, status, **limits):
+        with self.assertRaises(HttpError) as context:
+            parse_all(data, **limits)
+        self.assertEqual(context.exception.status, status)
+    
+    def test_valid_chunks(self):
+        data = CHUNKED_HEAD + b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n"
+        [request] = parse_all(data)
+        self.assertEqual(request.body, b"hello world")
+    
+    def test_negative_size(self):
+        self.assert_status(CHUNKED_HEAD + b"-5\r\nabc\r\n", 400)
+    
+    def test_sign_prefix_and_separators(self):
+        for size in (b"+5", b"0x5", b"0X5", b"5_0", b"", b" ", b"g"):
+            with self.subTest(size=size):
+                self.assert_status(CHUNKED_HEAD + size + b"\r\nhello\r\n0\r\n\r\n", 400)
+    
+    def test_oversized_size(self):
+        self.assert_status(CHUNKED_HEAD + b"ffffffffffffffff\r\nabc\r\n", 413)
+    
+    def test_oversized_size_line(self):
+        self.assert_status(CHUNKED_HEAD + b"1" * 2000 + b"\r\n", 400)
+    
+    def test_chunks_over_body_limit(self):
+        chunk = b"10\r\n" + b"a" * 16 + b"\r\n"
+        self.assert_status(CHUNKED_HEAD + chunk * 3 + b"0\r\n\r\n", 413, max_body_size=40)
+
+class SegmentTest(unittest.TestCase):
+    """Запросы, пришедшие несколькими сегментами"""
+    
+    def test_headers_split_across_feeds(self):
+        data = b"GET /index.html HTTP/1.1\r\nHost: x\r\nUser-Agent: test\r\n\r\n"
+        for split in range(1, len(data)):
+            with self.subTest(split=split):
+                [request] = parse_all(data[:split], data[split:])
+                self.assertEqual(request.path, '/index.html')
+                self.assertEqual(request.headers['user-agent'], 'test')
+    
+    def test_byte_by_byte_pipeline(self):
+        data = (b"POST /add HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello" + CHUNKED_HEAD +
+                b"3\r\nabc\r\n0\r\nX-Trailer: 1\r\n\r\nGET / HTTP/1.0\r\n\r\n")
+        requests = parse_all(*(data[index:index + 1] for index in range(len(data))))
+        self.assertEqual([request.body for request in requests], [b"hello", b"abc", b""])
+        self.assertEqual([request.keep_alive for request in requests], [True, True, False])
+    
+    def test_header_limit(self):
+        with self.assertRaises(HttpError) as context:
+            parse_all(b"GET / HTTP/1.1\r\nX: " + b"a" * 2000, max_header_size=1024)
+        self.assertEqual(context.exception.status, 431)
+
+if __name__ == "__main__":
+    unittest.main()
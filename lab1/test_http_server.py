@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Модульные тесты отправки ответов HTTP-сервера задания 3 (task3_http_server/http_server.py)
+
+Запуск: python3 -m unittest test_http_server (из каталога lab1)
+"""
+
+import mmap
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'task3_http_server'))
+import http_server
+
+class SlowReaderTest(unittest.TestCase):
+    """Клиент, читающий медленнее, чем истекает срок сокета"""
+    
+    def send_to_slow_reader(self, response, timeout=0.3):
+        """Отправляет ответ через send_response; возвращает (принятые байты, секунд)"""
+        server, client = socket.socketpair()
+        server.settimeout(timeout)
+        received = bytearray()
+        
+        def read_slowly():
+            while chunk := client.recv(64 * 1024):
+                received.extend(chunk)
+                time.sleep(0.01)
+        
+        reader = threading.Thread(target=read_slowly)
+        reader.start()
+        started = time.monotonic()
+        try:
+            http_server.send_response(server, response)
+        finally:
+            elapsed = time.monotonic() - started
+            server.close()
+            reader.join()
+            client.close()
+        return bytes(received), elapsed
+    
+    def test_mapped_range_outlives_timeout(self):
+        data = os.urandom(8 * 1024 * 1024)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.flush()
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        head = b"HTTP/1.1 206 Partial Content\r\n\r\n"
+        received, elapsed = self.send_to_slow_reader(
+            [head, http_server.MappedSlice(mapping, 1000, len(data) - 1000)])
+        # Отправка длилась дольше срока сокета, но не была оборвана
+        self.assertGreater(elapsed, 0.3)
+        self.assertEqual(received, head + data[1000:])
+        self.assertTrue(mapping.closed)
+    
+    def test_pipelined_bytes_outlive_timeout(self):
+        bodies = [os.urandom(1024 * 1024) for _ in range(4)]
+        received, elapsed = self.send_to_slow_reader(bodies)
+        self.assertGreater(elapsed, 0.3)
+        self.assertEqual(received, b"".join(bodies))
+
+if __name__ == "__main__":
+    unittest.main()